@@ -0,0 +1,92 @@
+import threading
+from concurrent.futures import Future
+
+
+class QueueFullError(Exception):
+    """Raised when the admission queue has no room for more held requests"""
+
+    def __init__(self, name, max_size, retry_after):
+        self.name = name
+        self.max_size = max_size
+        self.retry_after = retry_after
+        super().__init__(f"{name} queue is full ({max_size} requests waiting), retry in {retry_after}s")
+
+
+class AdmissionQueue:
+    """Bounded holding area for requests that arrive while the upstream is not ready
+
+    hold() parks items and returns one Future per item. Once the upstream is
+    ready, flush() starts every held item and resolves the futures with the
+    results; fail() instead resolves them all with an error.
+    Items whose future was cancelled (the caller gave up) are skipped.
+    """
+
+    def __init__(self, max_size=64, retry_after=30, name="admission"):
+        self.max_size = max_size
+        self.retry_after = retry_after
+        self.name = name
+        self._lock = threading.Lock()
+        self._held = []
+        self.admitted = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.failed = 0
+        self.abandoned = 0
+
+    def hold(self, items):
+        """Hold all of items or none of them; raises QueueFullError if they don't fit"""
+        with self._lock:
+            if len(self._held) + len(items) > self.max_size:
+                self.rejected += len(items)
+                raise QueueFullError(self.name, self.max_size, self.retry_after)
+            futures = [Future() for _ in items]
+            self._held.extend(zip(items, futures))
+            self.admitted += len(items)
+        return futures
+
+    def flush(self, submit):
+        """Start every held item, in arrival order, with submit(item), which returns a Future for its result"""
+        for item, future in self._take():
+            if not future.set_running_or_notify_cancel():
+                with self._lock:
+                    self.abandoned += 1
+                continue
+            submit(item).add_done_callback(lambda done, future=future: self._resolve(future, done))
+            with self._lock:
+                self.flushed += 1
+
+    def fail(self, error):
+        """Resolve every held item with error"""
+        for _, future in self._take():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(error)
+                with self._lock:
+                    self.failed += 1
+            else:
+                with self._lock:
+                    self.abandoned += 1
+
+    def _take(self):
+        with self._lock:
+            held, self._held = self._held, []
+        return held
+
+    @staticmethod
+    def _resolve(future, done):
+        error = done.exception()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(done.result())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'held': len(self._held),
+                'max_size': self.max_size,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'flushed': self.flushed,
+                'failed': self.failed,
+                'abandoned': self.abandoned
+            }
@@ -4,6 +4,28 @@ from gradio_client import Client
 import logging
 import time
 import json
+import os
+import threading
+import contextvars
+from contextlib import ExitStack
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from admission_queue import AdmissionQueue, QueueFullError
+from bulkhead import Bulkhead
+from circuit_breaker import CLOSED, CircuitBreaker, CircuitOpenError
+from client_pool import ClientPool
+from concurrency_limiter import AdaptiveLimiter, LimitExceeded
+from deadline import Deadline, DeadlineExceeded, remaining_or, sleep_within
+from load_shedder import LoadShedder, shed_load
+from metrics import CLIENT_ACQUIRE, PARSE, QUEUE_WAIT, RETRY_SLEEP, SERIALIZE, UPSTREAM, instrument, record, stage
+from liveness import FULL_INFERENCE, PROBE, VerificationStats, probe_space
+from prediction import build_response, is_cacheable, parse_space_result
+from rolling_stats import RollingStats
+from retry_policy import (
+    RATE_LIMITED, RetryStats, SPACE_WAKING, TIMEOUT, UPSTREAM_UNAVAILABLE, classify_error, is_retryable
+)
+from result_cache import ResultCache, normalize_text
+from single_flight import SingleFlight
 
 app = Flask(__name__)
 
@@ -23,65 +45,593 @@ logger = logging.getLogger(__name__)
 # Your Hugging Face Space endpoint
 SPACE_NAME = "Anurag3703/bert-spam-classifier-demo"
 
-# Global client variable (lazy loaded)
+# Global client variable (lazy loaded); _client_lock guards it and _connect_flight makes sure
+# only one connection attempt runs at a time, with every other caller waiting for its outcome
+# (unless the attempt only ran out of its own caller's time budget; then the next waiter tries)
 _client = None
 _client_init_time = None
+_client_lock = threading.Lock()
+_connect_flight = SingleFlight(leader_errors=(DeadlineExceeded, FutureTimeoutError))
+
+# The client is replaced in the background once it is CLIENT_TTL_SECONDS - CLIENT_REFRESH_AHEAD_SECONDS
+# old; requests keep using the current one until the replacement is verified
+CLIENT_TTL_SECONDS = float(os.environ.get('CLIENT_TTL_SECONDS', 300))
+CLIENT_REFRESH_AHEAD_SECONDS = float(os.environ.get('CLIENT_REFRESH_AHEAD_SECONDS', 60))
+CLIENT_REFRESH_RETRY_SECONDS = float(os.environ.get('CLIENT_REFRESH_RETRY_SECONDS', 30))
+LIVENESS_PROBE_TIMEOUT = float(os.environ.get('LIVENESS_PROBE_TIMEOUT', 10))
+_verification_stats = VerificationStats()
+_refresh_lock = threading.Lock()
+_refresh_state = {
+    'in_progress': False,
+    'refreshes': 0,
+    'failures': 0,
+    'last_attempt_at': None,
+    'last_success_at': None,
+    'last_duration_seconds': None,
+    'last_error': None
+}
+
+# Background warmup progress: idle -> connecting -> verifying -> ready | failed
+_warmup_lock = threading.Lock()
+_warmup_state = {
+    'state': 'idle',
+    'trigger': None,
+    'attempt': 0,
+    'started_at': None,
+    'finished_at': None,
+    'error': None
+}
+
+# This worker's boot and first-warm times; with preload_app = False each gunicorn worker imports the app itself
+_worker_state = {
+    'pid': os.getpid(),
+    'booted_at': time.time(),
+    'warm_at': None
+}
+
+# Cache of upstream predictions keyed on normalized text (spam campaigns repeat a lot)
+CACHE_MAX_SIZE = int(os.environ.get('CACHE_MAX_SIZE', 10000))
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', 3600))
+_result_cache = ResultCache(max_size=CACHE_MAX_SIZE, ttl=CACHE_TTL_SECONDS)
+
+# Concurrent requests for the same text share a single upstream prediction; a timeout of the
+# request that made the call isn't passed on to the others, which retry within their own budgets
+# Time spent waiting on another request's prediction counts as that request's upstream time
+_predict_flight = SingleFlight(
+    leader_errors=(DeadlineExceeded, FutureTimeoutError), on_wait=lambda seconds: record(UPSTREAM, seconds)
+)
+
+# Fail fast while the Space is known to be down instead of burning worker time on retries
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RECOVERY_SECONDS = float(os.environ.get('CIRCUIT_RECOVERY_SECONDS', 30))
+_space_breaker = CircuitBreaker(
+    'space',
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    recovery_timeout=CIRCUIT_RECOVERY_SECONDS
+)
+
+# Upstream errors by category; only retryable categories go through the backoff schedule
+_retry_stats = RetryStats()
+
+# Upstream latency percentiles, error/retry rates and cache hit ratio over the last 1, 5 and 15 minutes
+_upstream_stats = RollingStats(windows=(60, 300, 900), ignore_errors=(DeadlineExceeded, CircuitOpenError))
+
+# Time budget per request; callers can ask for less (or more, up to the max) via X-Request-Timeout
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get('REQUEST_TIMEOUT_SECONDS', 120))
+MAX_REQUEST_TIMEOUT_SECONDS = float(os.environ.get('MAX_REQUEST_TIMEOUT_SECONDS', 290))
+
+# Pre-connected clients so concurrent requests can predict in parallel
+CLIENT_POOL_SIZE = int(os.environ.get('CLIENT_POOL_SIZE', 4))
+BATCH_CLIENT_POOL_SIZE = int(os.environ.get('BATCH_CLIENT_POOL_SIZE', 2))
+CLIENT_CHECKOUT_TIMEOUT = float(os.environ.get('CLIENT_CHECKOUT_TIMEOUT', 60))
+
+
+def _new_client_pool(size, name):
+    return ClientPool(
+        lambda: Client(SPACE_NAME, verbose=False),
+        size=size,
+        ignore_errors=(DeadlineExceeded, CircuitOpenError, LimitExceeded),
+        name=name
+    )
+
+# Adaptive (AIMD) limit on predictions in flight to the Space; it can't usefully exceed the clients.
+# Waiting /classify calls get free slots ahead of /classify/batch items, which keep a minimum share
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+BATCH_MIN_SHARE = float(os.environ.get('BATCH_MIN_SHARE', 0.2))
+UPSTREAM_LIMIT_MIN = int(os.environ.get('UPSTREAM_LIMIT_MIN', 1))
+UPSTREAM_LIMIT_MAX = int(os.environ.get('UPSTREAM_LIMIT_MAX', CLIENT_POOL_SIZE + BATCH_CLIENT_POOL_SIZE))
+UPSTREAM_LIMIT_TOLERANCE = float(os.environ.get('UPSTREAM_LIMIT_TOLERANCE', 3))
+_space_limiter = AdaptiveLimiter(
+    name='space',
+    initial_limit=UPSTREAM_LIMIT_MAX,
+    min_limit=UPSTREAM_LIMIT_MIN,
+    max_limit=UPSTREAM_LIMIT_MAX,
+    tolerance=UPSTREAM_LIMIT_TOLERANCE,
+    is_overload=lambda error: classify_error(error) in (TIMEOUT, RATE_LIMITED, UPSTREAM_UNAVAILABLE),
+    lanes=(INTERACTIVE, BATCH),
+    min_share=BATCH_MIN_SHARE
+)
+
+# Bulkheads: /classify and /classify/batch each get their own worker threads and Space clients,
+# so a runaway batch can't take the threads or connections interactive requests depend on
+INTERACTIVE_WORKERS = int(os.environ.get('INTERACTIVE_WORKERS', 8))
+BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', 8))
+_bulkheads = {
+    INTERACTIVE: Bulkhead(
+        INTERACTIVE, workers=INTERACTIVE_WORKERS, pool=_new_client_pool(CLIENT_POOL_SIZE, 'space-clients')
+    ),
+    BATCH: Bulkhead(
+        BATCH, workers=BATCH_MAX_CONCURRENCY, pool=_new_client_pool(BATCH_CLIENT_POOL_SIZE, 'space-batch-clients')
+    )
+}
+
+# Prometheus metrics at /metrics: request counts and latencies, per-stage timings, retries, circuit state
+instrument(app, 'space', retry_stats=_retry_stats, breakers=[_space_breaker], limiters=[_space_limiter])
+
+# Admission control: reject with 429 once too many texts or requests are pending or requests have been
+# getting slow, rather than letting them run into the worker timeout. /classify and /classify/batch
+# have separate budgets, so a big batch can't get interactive requests shed. Gunicorn's gthread worker
+# lets at most GUNICORN_THREADS requests into the app: interactive requests may use all but one thread
+# (kept for /health, /ready, /warmup and quick 429s), batch requests at most half of them
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 8))
+SHED_MAX_PENDING = int(os.environ.get('SHED_MAX_PENDING', 64))
+SHED_MAX_REQUESTS = int(os.environ.get('SHED_MAX_REQUESTS', max(1, GUNICORN_THREADS - 1)))
+SHED_MAX_BATCH_PENDING = int(os.environ.get('SHED_MAX_BATCH_PENDING', 64))
+SHED_MAX_BATCH_REQUESTS = int(os.environ.get('SHED_MAX_BATCH_REQUESTS', max(1, GUNICORN_THREADS // 2)))
+SHED_MAX_LATENCY_SECONDS = float(os.environ.get('SHED_MAX_LATENCY_SECONDS', 30))
+_load_shedders = {
+    INTERACTIVE: LoadShedder(
+        name='classifier',
+        max_pending=SHED_MAX_PENDING,
+        max_requests=SHED_MAX_REQUESTS,
+        max_latency=SHED_MAX_LATENCY_SECONDS
+    ),
+    BATCH: LoadShedder(
+        name='classifier-batch',
+        max_pending=SHED_MAX_BATCH_PENDING,
+        max_requests=SHED_MAX_BATCH_REQUESTS,
+        max_latency=SHED_MAX_LATENCY_SECONDS
+    )
+}
+
+# Requests that arrive while there is no client wait here for one shared connection attempt and are
+# then flushed through their bulkheads; beyond COLD_START_QUEUE_SIZE texts they get a 503
+COLD_START_QUEUE_SIZE = int(os.environ.get('COLD_START_QUEUE_SIZE', 64))
+COLD_START_CONNECT_RETRIES = int(os.environ.get('COLD_START_CONNECT_RETRIES', 5))
+COLD_START_RETRY_DELAY = int(os.environ.get('COLD_START_RETRY_DELAY', 15))
+_cold_start_queue = AdmissionQueue(
+    max_size=COLD_START_QUEUE_SIZE, retry_after=COLD_START_RETRY_DELAY, name='cold-start'
+)
+_cold_start_lock = threading.Lock()
+_cold_start_state = {
+    'connecting': False,
+    'started_at': None,
+    'connects': 0,
+    'failures': 0,
+    'last_connect_seconds': None
+}
+
+
+def get_client(max_retries=3, retry_delay=10, on_progress=None, use_circuit=True, deadline=None,
+               full_verify=False, force=False):
+    """
+    Lazy load the Gradio client with improved retry logic
 
+    Concurrent callers that need a connection share a single attempt. With
+    force=True (warmup) a new connection is made even if a client exists; the
+    current client keeps serving until the new one is verified.
 
-def get_client(max_retries=3, retry_delay=10):
-    """Lazy load the Gradio client with improved retry logic"""
-    global _client, _client_init_time
+    New connections are checked with a cheap liveness probe; full_verify=True
+    (warmup) runs a real test prediction instead.
+
+    on_progress, if given, is called as on_progress(stage, attempt) with stage
+    'connecting' or 'verifying'. With use_circuit=False (explicit warmup) the
+    attempts are not blocked by an open circuit, but their outcome still
+    counts towards it. With a deadline, attempts and retry waits stop as soon
+    as the budget can't cover them (DeadlineExceeded).
+    """
+    with _client_lock:
+        client, init_time = _client, _client_init_time
+
+    # Serve the current client; refresh it in the background as it gets old
+    if client is not None and not force:
+        if time.time() - init_time >= CLIENT_TTL_SECONDS - CLIENT_REFRESH_AHEAD_SECONDS:
+            _start_client_refresh()
+        return client
+
+    try:
+        return _connect_flight.do(
+            'connect', _connect_with_retry,
+            max_retries, retry_delay, on_progress, use_circuit, deadline, full_verify,
+            timeout=remaining_or(deadline)
+        )
+    except FutureTimeoutError:
+        raise DeadlineExceeded(f"Request timed out after {deadline.timeout}s (waiting for the Space connection)")
 
-    # Return cached client if it exists and was created recently (within 5 minutes)
-    if _client is not None:
-        if _client_init_time and (time.time() - _client_init_time) < 300:
-            return _client
-        else:
-            logger.info("Client cache expired, reinitializing...")
-            _client = None
 
+def _connect_with_retry(max_retries, retry_delay, on_progress, use_circuit, deadline, full_verify):
+    """Connect and verify a new client, retrying while the Space wakes up; runs one at a time"""
     for attempt in range(max_retries):
+        if deadline:
+            deadline.check("connecting to the Space")
+        if use_circuit:
+            _space_breaker.before_call()
         try:
             logger.info(f"Connecting to Space (attempt {attempt + 1}/{max_retries}): {SPACE_NAME}")
+            client = _connect_client(
+                deadline=deadline, on_progress=on_progress, attempt=attempt + 1, full_verify=full_verify
+            )
 
-            # Try to initialize client with timeout
-            _client = Client(SPACE_NAME, verbose=False)
-
-            # Test the connection with a simple prediction
-            logger.info("Testing connection with sample text...")
-            test_result = _client.predict("test", api_name="/predict")
-
-            _client_init_time = time.time()
+            _space_breaker.record_success()
             logger.info("✅ Connected and verified Space successfully!")
-            return _client
+            _install_client(client)
+            return client
 
         except json.JSONDecodeError as e:
             logger.error(f"JSON parsing error on attempt {attempt + 1}: {str(e)}")
+            _space_breaker.record_failure()
+            _retry_stats.record(SPACE_WAKING, retried=attempt < max_retries - 1)
             if attempt < max_retries - 1:
                 wait_time = retry_delay * (attempt + 1)
                 logger.info(f"Space might still be waking up. Waiting {wait_time}s...")
-                time.sleep(wait_time)
+                sleep_within(wait_time, deadline, "connection attempt")
             else:
                 raise Exception(
                     "Space returned invalid response. It might still be starting up. "
                     "Please wait 30-60 seconds and try again."
                 )
         except Exception as e:
-            logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
+            category = classify_error(e, stage='connect')
+            logger.warning(f"Attempt {attempt + 1} failed ({category}): {str(e)}")
+            _space_breaker.record_failure()
+            if not is_retryable(category):
+                _retry_stats.record(category, retried=False)
+                raise Exception(f"Could not connect to Space ({category}): {str(e)}")
+            _retry_stats.record(category, retried=attempt < max_retries - 1)
             if attempt < max_retries - 1:
                 wait_time = retry_delay * (attempt + 1)
                 logger.info(f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
+                sleep_within(wait_time, deadline, "connection attempt")
             else:
                 raise Exception(
                     f"Could not connect to Space after {max_retries} attempts. "
                     "The Space might be sleeping or unavailable. Please try /warmup first."
                 )
 
-    return _client
+
+def _connect_client(deadline=None, on_progress=None, attempt=1, full_verify=False):
+    """Create a new Gradio client and verify it with a liveness probe (or a full test prediction)"""
+    if on_progress:
+        on_progress('connecting', attempt)
+
+    # Try to initialize client with timeout
+    client = Client(SPACE_NAME, verbose=False)
+
+    try:
+        if on_progress:
+            on_progress('verifying', attempt)
+        if full_verify:
+            # Test the connection with a simple prediction
+            logger.info("Testing connection with sample text...")
+            _verification_stats.timed(
+                FULL_INFERENCE,
+                lambda: client.submit("test", api_name="/predict").result(timeout=remaining_or(deadline))
+            )
+        else:
+            logger.info("Probing Space liveness...")
+            timeout = min(LIVENESS_PROBE_TIMEOUT, remaining_or(deadline, LIVENESS_PROBE_TIMEOUT))
+            _verification_stats.timed(PROBE, probe_space, client, timeout=timeout)
+    except BaseException:
+        # Stop the client's heartbeat thread; it is never used
+        client.close()
+        raise
+
+    return client
+
+
+def _install_client(client):
+    """Make a verified client the current one and renew the pools, the interactive one around it"""
+    global _client, _client_init_time
+
+    with _client_lock:
+        _client = client
+        _client_init_time = time.time()
+        first = _worker_state['warm_at'] is None
+        if first:
+            _worker_state['warm_at'] = _client_init_time
+    if first:
+        logger.info(
+            f"✅ Worker {_worker_state['pid']} warm {_client_init_time - _worker_state['booted_at']:.2f}s after boot"
+        )
+    # Pooled clients are swapped one at a time, each old one serving until its replacement exists
+    _bulkheads[INTERACTIVE].pool.renew(seed=client)
+    _bulkheads[BATCH].pool.renew()
+
+
+def worker_status():
+    """This worker's pid, uptime and how long it took to get its first verified client"""
+    with _client_lock:
+        booted_at, warm_at = _worker_state['booted_at'], _worker_state['warm_at']
+    return {
+        'pid': _worker_state['pid'],
+        'uptime_seconds': round(time.time() - booted_at, 0),
+        'time_to_warm_seconds': round(warm_at - booted_at, 2) if warm_at else None
+    }
+
+
+def _start_client_refresh():
+    """Start a background refresh unless one is running or the last one failed too recently"""
+    with _refresh_lock:
+        if _refresh_state['in_progress']:
+            return False
+        last_attempt = _refresh_state['last_attempt_at']
+        if (_refresh_state['last_error'] and last_attempt
+                and time.time() - last_attempt < CLIENT_REFRESH_RETRY_SECONDS):
+            return False
+        _refresh_state['in_progress'] = True
+        _refresh_state['last_attempt_at'] = time.time()
+
+    threading.Thread(target=_refresh_client, name='client-refresh', daemon=True).start()
+    return True
+
+
+def _refresh_client():
+    """Connect and verify a replacement client, then swap it in; the old one serves until then"""
+    start = time.time()
+    try:
+        logger.info("Refreshing Space client in the background...")
+        # Shares the connect flight so a refresh never races a reconnect or warmup
+        _connect_flight.do('connect', _refresh_connect)
+        with _refresh_lock:
+            _refresh_state['refreshes'] += 1
+            _refresh_state['last_success_at'] = time.time()
+            _refresh_state['last_error'] = None
+        logger.info(f"✅ Space client refreshed in {time.time() - start:.2f}s")
+    except Exception as e:
+        logger.warning(f"Background client refresh failed: {str(e)}")
+        with _refresh_lock:
+            _refresh_state['failures'] += 1
+            _refresh_state['last_error'] = str(e)
+    finally:
+        with _refresh_lock:
+            _refresh_state['in_progress'] = False
+            _refresh_state['last_duration_seconds'] = round(time.time() - start, 2)
+
+
+def _refresh_connect():
+    client = _space_breaker.call(_connect_client)
+    _install_client(client)
+    return client
+
+
+def client_refresh_status():
+    """Snapshot of the client lifecycle for /health"""
+    with _refresh_lock:
+        status = dict(_refresh_state)
+    for key in ('last_attempt_at', 'last_success_at'):
+        if status[key]:
+            status[key + '_seconds_ago'] = round(time.time() - status.pop(key), 0)
+        else:
+            status.pop(key)
+    status['ttl_seconds'] = CLIENT_TTL_SECONDS
+    status['refresh_ahead_seconds'] = CLIENT_REFRESH_AHEAD_SECONDS
+    return status
+
+
+def predict_text(text, max_retries=3, deadline=None, lane=INTERACTIVE):
+    """Run a prediction through the result cache, retrying upstream failures; lane sets its upstream priority"""
+    cache_key = normalize_text(text)
+    result = _result_cache.get(cache_key)
+    _upstream_stats.record_cache(hit=result is not None)
+    if result is not None:
+        logger.info("Cache hit")
+        return result
+
+    try:
+        # Per lane, so a /classify never waits behind a batch item's client and upstream priority
+        return _predict_flight.do(
+            (lane, cache_key), _predict_upstream, text, cache_key, max_retries, deadline, lane,
+            timeout=remaining_or(deadline)
+        )
+    except FutureTimeoutError:
+        raise DeadlineExceeded(f"Request timed out after {deadline.timeout}s (waiting for prediction)")
+
+
+def _predict_upstream(text, cache_key, max_retries, deadline=None, lane=INTERACTIVE):
+    """Call the Space with retry using a pooled client, and store the result in the cache"""
+    result = None
+    for attempt in range(max_retries):
+        if deadline:
+            deadline.check("prediction")
+        try:
+            logger.info(f"Prediction attempt {attempt + 1}/{max_retries}")
+            # The client comes from the lane's own bulkhead; the upstream slot is shared, in priority order
+            checkout_timeout = min(CLIENT_CHECKOUT_TIMEOUT, remaining_or(deadline, CLIENT_CHECKOUT_TIMEOUT))
+            with ExitStack() as stack:
+                with stage(CLIENT_ACQUIRE):
+                    client = stack.enter_context(_bulkheads[lane].pool.checkout(timeout=checkout_timeout))
+                with stage(QUEUE_WAIT):
+                    stack.enter_context(_space_limiter.slot(timeout=remaining_or(deadline), lane=lane))
+                with stage(UPSTREAM), _upstream_stats.upstream_call(retry=attempt > 0):
+                    result = _call_space(client, text, deadline)
+            logger.info(f"Raw result: {result}")
+            break
+        except LimitExceeded:
+            raise DeadlineExceeded(f"Request timed out after {deadline.timeout}s (waiting for an upstream slot)")
+        except (CircuitOpenError, DeadlineExceeded):
+            raise
+        except Exception as e:
+            category = classify_error(e)
+            logger.warning(f"Prediction attempt {attempt + 1} failed ({category}): {str(e)}")
+            retry = is_retryable(category) and attempt < max_retries - 1
+            _retry_stats.record(category, retried=retry)
+            if retry:
+                with stage(RETRY_SLEEP):
+                    sleep_within(5 * (attempt + 1), deadline, "prediction attempt")
+            else:
+                raise Exception(f"Prediction failed after {attempt + 1} attempts ({category}): {str(e)}")
+
+    # An answer we can't parse is returned (and reported) but never pinned in the cache
+    if is_cacheable(result):
+        _result_cache.set(cache_key, result)
+    return result
+
+
+def _call_space(client, text, deadline=None):
+    """One prediction through the circuit breaker, abandoned if the deadline passes first"""
+    _space_breaker.before_call()
+    try:
+        job = client.submit(text, api_name="/predict")
+        result = job.result(timeout=remaining_or(deadline))
+    except FutureTimeoutError:
+        # Running out of budget says nothing about the Space's health (nor, as DeadlineExceeded, its load)
+        job.cancel()
+        _space_breaker.release()
+        raise DeadlineExceeded(f"Request timed out after {deadline.timeout}s (waiting for the Space)")
+    except Exception as e:
+        # Deterministic failures (bad input, malformed output) mean the Space did answer
+        if is_retryable(classify_error(e)):
+            _space_breaker.record_failure()
+        else:
+            _space_breaker.record_success()
+        raise
+    _space_breaker.record_success()
+    return result
+
+
+def hold_for_client(texts, max_retries, deadline, lane=INTERACTIVE):
+    """
+    Park texts in the cold-start queue if there is no client yet
+
+    Returns one future per text with its raw prediction, or None when a
+    client is already connected and the caller should predict directly.
+    The first held request starts the connection attempt.
+    """
+    with _cold_start_lock:
+        if _client is not None:
+            return None
+        _space_breaker.check()
+        # Each held prediction later runs in a copy of this request's context (metrics labels, timings)
+        held_at = time.perf_counter()
+        futures = _cold_start_queue.hold([
+            (text, max_retries, deadline, lane, contextvars.copy_context(), held_at) for text in texts
+        ])
+        if not _cold_start_state['connecting']:
+            _cold_start_state['connecting'] = True
+            _cold_start_state['started_at'] = time.time()
+            threading.Thread(target=_connect_and_flush, name='cold-start-connect', daemon=True).start()
+    return futures
+
+
+def _connect_and_flush():
+    """Connect once on behalf of every held request, then flush them through the batch pool"""
+    try:
+        get_client(max_retries=COLD_START_CONNECT_RETRIES, retry_delay=COLD_START_RETRY_DELAY)
+    except Exception as e:
+        logger.warning(f"Cold-start connection failed, rejecting held requests: {str(e)}")
+        with _cold_start_lock:
+            _cold_start_state['connecting'] = False
+            _cold_start_state['failures'] += 1
+            _cold_start_queue.fail(e)
+        return
+
+    with _cold_start_lock:
+        _cold_start_state['connecting'] = False
+        _cold_start_state['connects'] += 1
+        _cold_start_state['last_connect_seconds'] = round(time.time() - _cold_start_state['started_at'], 2)
+        logger.info(f"Flushing {_cold_start_queue.stats()['held']} held requests after cold start")
+        _cold_start_queue.flush(_start_held)
+
+
+def _start_held(item):
+    """Run a held prediction on its lane's bulkhead, in the context of the request that held it"""
+    text, max_retries, deadline, lane, context, held_at = item
+    # Time spent held counts as acquiring the client
+    context.run(record, CLIENT_ACQUIRE, time.perf_counter() - held_at)
+    return context.run(submit_to, lane, predict_text, text, max_retries, deadline, lane)
+
+
+def submit_to(lane, fn, *args, **kwargs):
+    """Run fn on the lane's bulkhead, recording how long it waited for a worker"""
+    queued_at = time.perf_counter()
+
+    def run():
+        record(QUEUE_WAIT, time.perf_counter() - queued_at)
+        return fn(*args, **kwargs)
+
+    return _bulkheads[lane].submit(run)
+
+
+def await_result(future, deadline=None, what="waiting for the Space to wake up"):
+    """Wait for a held or bulkhead-submitted prediction within the request's deadline"""
+    try:
+        return future.result(timeout=remaining_or(deadline))
+    except FutureTimeoutError:
+        future.cancel()
+        raise DeadlineExceeded(f"Request timed out after {deadline.timeout}s ({what})")
+
+
+def cold_start_status():
+    """Snapshot of the cold-start queue for /health"""
+    with _cold_start_lock:
+        status = dict(_cold_start_state)
+    status.pop('started_at')
+    status.update(_cold_start_queue.stats())
+    return status
+
+
+def _queue_full_response(error):
+    """503 with Retry-After for requests that don't fit in the cold-start queue"""
+    response = jsonify({
+        'error': str(error),
+        'status': 'queue_full',
+        'retry_after_seconds': error.retry_after,
+        'suggestion': 'The Space is waking up. Retry after the indicated delay.'
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+
+def _request_deadline():
+    """Deadline for the current request from X-Request-Timeout or the server default"""
+    return Deadline.from_header(
+        request.headers.get('X-Request-Timeout'),
+        default=REQUEST_TIMEOUT_SECONDS,
+        maximum=MAX_REQUEST_TIMEOUT_SECONDS
+    )
+
+
+def _deadline_exceeded_response(error):
+    """504 for requests whose time budget ran out"""
+    return jsonify({
+        'error': str(error),
+        'status': 'timeout',
+        'suggestion': 'Retry with a larger X-Request-Timeout, or hit /warmup if the Space is asleep.'
+    }), 504
+
+
+def _circuit_open_response(error):
+    """503 with Retry-After for requests rejected by the open circuit"""
+    response = jsonify({
+        'error': str(error),
+        'status': 'circuit_open',
+        'retry_after_seconds': error.retry_after,
+        'suggestion': 'The Space is currently unavailable. Retry after the indicated delay or hit /warmup.'
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+
+def _request_cost():
+    """Units of work in the current request: one per text"""
+    data = request.get_json(silent=True)
+    texts = data.get('texts') if isinstance(data, dict) else None
+    return max(1, len(texts)) if isinstance(texts, list) else 1
 
 
 @app.route('/classify', methods=['POST'])
+@shed_load(_load_shedders[INTERACTIVE])
 def classify():
     """
     Classify text as spam or ham using your HF Space
@@ -102,6 +652,7 @@ def classify():
         }
     }
     """
+    deadline = _request_deadline()
     try:
         # Get input text
         data = request.get_json()
@@ -112,9 +663,20 @@ def classify():
 
         logger.info(f"Classifying text: '{text[:50]}...'")
 
-        # Get client with retry logic
+        # Get client with retry logic; during a cold start wait in the queue instead
         try:
-            client = get_client()
+            held = hold_for_client([text], 3, deadline)
+            if held:
+                result = await_result(held[0], deadline)
+            else:
+                with stage(CLIENT_ACQUIRE):
+                    get_client(deadline=deadline)
+        except CircuitOpenError as e:
+            return _circuit_open_response(e)
+        except QueueFullError as e:
+            return _queue_full_response(e)
+        except DeadlineExceeded as e:
+            return _deadline_exceeded_response(e)
         except Exception as e:
             return jsonify({
                 'error': str(e),
@@ -122,71 +684,27 @@ def classify():
                 'status': 'space_unavailable'
             }), 503
 
-        # Call Space API with retry
-        max_predict_retries = 3
-        result = None
-
-        for attempt in range(max_predict_retries):
-            try:
-                logger.info(f"Prediction attempt {attempt + 1}/{max_predict_retries}")
-                result = client.predict(text, api_name="/predict")
-                logger.info(f"Raw result: {result}")
-                break
-            except Exception as e:
-                logger.warning(f"Prediction attempt {attempt + 1} failed: {str(e)}")
-                if attempt < max_predict_retries - 1:
-                    time.sleep(5 * (attempt + 1))
-                else:
-                    raise Exception(f"Prediction failed after {max_predict_retries} attempts: {str(e)}")
+        if not held:
+            # Call Space API with retry (served from cache when possible) on the interactive bulkhead
+            future = submit_to(INTERACTIVE, predict_text, text, deadline=deadline)
+            result = await_result(future, deadline, "waiting for prediction")
 
         # Parse the result - handle different possible formats
         try:
-            # Format 1: Dictionary with 'confidences' key
-            if isinstance(result, dict) and 'confidences' in result:
-                spam_confidence = next(
-                    (item['confidence'] for item in result['confidences'] if 'Spam' in item['label']),
-                    0
-                )
-                ham_confidence = next(
-                    (item['confidence'] for item in result['confidences'] if 'Ham' in item['label']),
-                    0
-                )
-            # Format 2: Dictionary with 'label' key (direct output)
-            elif isinstance(result, dict) and 'label' in result:
-                if result['label'] == 'Spam':
-                    spam_confidence = result.get('confidence', 0.5)
-                    ham_confidence = 1 - spam_confidence
-                else:
-                    ham_confidence = result.get('confidence', 0.5)
-                    spam_confidence = 1 - ham_confidence
-            # Format 3: Tuple or list format
-            elif isinstance(result, (tuple, list)):
-                # Assume first element is label, second is confidence dict
-                spam_confidence = result[1].get('Spam', 0) if len(result) > 1 else 0
-                ham_confidence = result[1].get('Ham', 0) if len(result) > 1 else 0
-            else:
+            with stage(PARSE):
+                parsed = parse_space_result(result)
+            if parsed is None:
                 logger.error(f"Unexpected result format: {result}")
                 return jsonify({
                     'error': 'Unexpected response format from model',
                     'raw_result': str(result)
                 }), 500
 
-            # Determine final label
-            label = "spam" if spam_confidence > ham_confidence else "ham"
-            confidence = max(spam_confidence, ham_confidence)
-
-            response = {
-                'text': text,
-                'label': label,
-                'confidence': round(confidence, 4),
-                'probabilities': {
-                    'spam': round(spam_confidence, 4),
-                    'ham': round(ham_confidence, 4)
-                }
-            }
+            response = build_response(text, *parsed)
 
-            logger.info(f"Result: {label} ({confidence:.2%} confidence)")
-            return jsonify(response)
+            logger.info(f"Result: {response['label']} ({response['confidence']:.2%} confidence)")
+            with stage(SERIALIZE):
+                return jsonify(response)
 
         except Exception as e:
             logger.error(f"Error parsing result: {str(e)}")
@@ -196,6 +714,10 @@ def classify():
                 'raw_result': str(result)
             }), 500
 
+    except CircuitOpenError as e:
+        return _circuit_open_response(e)
+    except DeadlineExceeded as e:
+        return _deadline_exceeded_response(e)
     except Exception as e:
         logger.error(f"Error during classification: {str(e)}")
         return jsonify({
@@ -205,6 +727,7 @@ def classify():
 
 
 @app.route('/classify/batch', methods=['POST'])
+@shed_load(_load_shedders[BATCH], cost=_request_cost)
 def classify_batch():
     """
     Classify multiple texts at once
@@ -214,6 +737,7 @@ def classify_batch():
         "texts": ["message 1", "message 2", ...]
     }
     """
+    deadline = _request_deadline()
     try:
         data = request.get_json()
         texts = data.get('texts', [])
@@ -221,39 +745,36 @@ def classify_batch():
         if not texts or not isinstance(texts, list):
             return jsonify({'error': 'Please provide a list of texts'}), 400
 
-        # Get client with retry logic
+        texts = [text for text in texts if text.strip()]
+
+        # Get client with retry logic; during a cold start the texts wait in the queue instead
         try:
-            client = get_client()
+            held = hold_for_client(texts, 1, deadline, lane=BATCH)
+            if not held:
+                with stage(CLIENT_ACQUIRE):
+                    get_client(deadline=deadline)
+        except CircuitOpenError as e:
+            return _circuit_open_response(e)
+        except QueueFullError as e:
+            return _queue_full_response(e)
+        except DeadlineExceeded as e:
+            return _deadline_exceeded_response(e)
         except Exception as e:
             return jsonify({
                 'error': str(e),
                 'suggestion': 'Try hitting the /warmup endpoint first'
             }), 503
 
-        results = []
-        for text in texts:
-            if text.strip():
-                try:
-                    result = client.predict(text, api_name="/predict")
-
-                    spam_conf = next((item['confidence'] for item in result['confidences']
-                                      if 'Spam' in item['label']), 0)
-                    ham_conf = next((item['confidence'] for item in result['confidences']
-                                     if 'Ham' in item['label']), 0)
-
-                    results.append({
-                        'text': text,
-                        'label': "spam" if spam_conf > ham_conf else "ham",
-                        'confidence': round(max(spam_conf, ham_conf), 4)
-                    })
-                except Exception as e:
-                    logger.warning(f"Failed to classify text '{text[:30]}...': {str(e)}")
-                    results.append({
-                        'text': text,
-                        'error': 'Classification failed'
-                    })
-
-        return jsonify({'results': results})
+        if held:
+            # Already running on the batch bulkhead once the client connects
+            results = [_classify_batch_item(text, deadline, future) for text, future in zip(texts, held)]
+        else:
+            # Fan out over the batch bulkhead; results stay in input order
+            futures = [submit_to(BATCH, _classify_batch_item, text, deadline) for text in texts]
+            results = [future.result() for future in futures]
+
+        with stage(SERIALIZE):
+            return jsonify({'results': results})
 
     except Exception as e:
         logger.error(f"Error during batch classification: {str(e)}")
@@ -263,51 +784,188 @@ def classify_batch():
         }), 500
 
 
-@app.route('/warmup', methods=['GET'])
-def warmup():
-    """Warmup endpoint to initialize the Space connection"""
+def _classify_batch_item(text, deadline=None, held=None):
+    """Classify one text of a batch, reporting failures inline; held is its cold-start queue future"""
     try:
-        logger.info("⏳ Warming up Space connection (this may take 30-60 seconds)...")
-        start_time = time.time()
+        if held is not None:
+            result = await_result(held, deadline)
+        else:
+            result = predict_text(text, max_retries=1, deadline=deadline, lane=BATCH)
+
+        with stage(PARSE):
+            spam_conf = next((item['confidence'] for item in result['confidences']
+                              if 'Spam' in item['label']), 0)
+            ham_conf = next((item['confidence'] for item in result['confidences']
+                             if 'Ham' in item['label']), 0)
+
+        return {
+            'text': text,
+            'label': "spam" if spam_conf > ham_conf else "ham",
+            'confidence': round(max(spam_conf, ham_conf), 4)
+        }
+    except CircuitOpenError as e:
+        return {
+            'text': text,
+            'error': 'Space unavailable',
+            'retry_after_seconds': e.retry_after
+        }
+    except DeadlineExceeded:
+        return {
+            'text': text,
+            'error': 'Timed out'
+        }
+    except Exception as e:
+        logger.warning(f"Failed to classify text '{text[:30]}...': {str(e)}")
+        return {
+            'text': text,
+            'error': 'Classification failed'
+        }
 
-        # Force reinitialize client
-        global _client
-        _client = None
 
-        client = get_client(max_retries=5, retry_delay=15)
+def _set_warmup_progress(stage, attempt):
+    with _warmup_lock:
+        _warmup_state['state'] = stage
+        _warmup_state['attempt'] = attempt
 
-        elapsed = time.time() - start_time
 
-        return jsonify({
-            'status': 'success',
-            'message': 'Space connection initialized and warmed up',
-            'space': SPACE_NAME,
-            'warmup_time_seconds': round(elapsed, 2)
-        })
+def _run_warmup():
+    """Reconnect to the Space in the background, recording progress in _warmup_state"""
+    try:
+        # Force a fresh, fully verified connection
+        get_client(
+            max_retries=5, retry_delay=15, on_progress=_set_warmup_progress, use_circuit=False,
+            full_verify=True, force=True
+        )
+
+        with _warmup_lock:
+            _warmup_state['state'] = 'ready'
+            _warmup_state['finished_at'] = time.time()
+        logger.info(f"✅ Warmup finished in {_warmup_state['finished_at'] - _warmup_state['started_at']:.2f}s")
     except Exception as e:
         logger.error(f"Warmup failed: {str(e)}")
-        return jsonify({
-            'status': 'failed',
-            'error': str(e),
-            'message': 'Could not connect to Space. It might still be starting up. Please wait 60 seconds and try again.',
-            'space': SPACE_NAME
-        }), 503
+        with _warmup_lock:
+            _warmup_state['state'] = 'failed'
+            _warmup_state['error'] = str(e)
+            _warmup_state['finished_at'] = time.time()
+
+
+def start_warmup(trigger='request'):
+    """Start a background warmup unless one is already running; returns True if started"""
+    with _warmup_lock:
+        if _warmup_state['state'] in ('connecting', 'verifying'):
+            return False
+        _warmup_state.update({
+            'state': 'connecting',
+            'trigger': trigger,
+            'attempt': 0,
+            'started_at': time.time(),
+            'finished_at': None,
+            'error': None
+        })
+
+    threading.Thread(target=_run_warmup, name='warmup', daemon=True).start()
+    return True
+
+
+def warmup_status():
+    """Snapshot of the background warmup progress"""
+    with _warmup_lock:
+        state = dict(_warmup_state)
+
+    elapsed = None
+    if state['started_at']:
+        elapsed = round((state['finished_at'] or time.time()) - state['started_at'], 2)
+
+    return {
+        'state': state['state'],
+        'trigger': state['trigger'],
+        'attempt': state['attempt'],
+        'elapsed_seconds': elapsed,
+        'error': state['error'],
+        'space': SPACE_NAME
+    }
+
+
+@app.route('/warmup', methods=['GET'])
+def warmup():
+    """Start warming up the Space connection in the background"""
+    started = start_warmup()
+    if started:
+        logger.info("⏳ Warming up Space connection in the background (this may take 30-60 seconds)...")
+
+    status = warmup_status()
+    status.update({
+        'status': 'accepted',
+        'message': 'Warmup started' if started else 'Warmup already in progress',
+        'status_url': '/warmup/status'
+    })
+    return jsonify(status), 202
+
+
+@app.route('/warmup/status', methods=['GET'])
+def warmup_status_endpoint():
+    """Report background warmup progress"""
+    return jsonify(warmup_status())
 
 
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     client_status = "connected" if _client is not None else "not_initialized"
+    client_age = None
+
+    if _client is not None and _client_init_time:
+        client_age = round(time.time() - _client_init_time, 0)
 
     return jsonify({
         'status': 'healthy',
         'space': SPACE_NAME,
         'space_url': f"https://{SPACE_NAME.replace('/', '-')}.hf.space",
         'client_status': client_status,
+        'client_age_seconds': client_age,
+        'client_refresh': client_refresh_status(),
+        'cache': _result_cache.stats(),
+        'coalescing': _predict_flight.stats(),
+        'bulkheads': {name: bulkhead.stats() for name, bulkhead in _bulkheads.items()},
+        'circuit': _space_breaker.stats(),
+        'concurrency': _space_limiter.stats(),
+        'upstream': {
+            'in_flight': _space_limiter.stats()['in_flight'],
+            'windows': _upstream_stats.snapshot()
+        },
+        'load_shedding': {lane: shedder.stats() for lane, shedder in _load_shedders.items()},
+        'upstream_errors': _retry_stats.stats(),
+        'verification': _verification_stats.stats(),
+        'worker': worker_status(),
+        'cold_start_queue': cold_start_status(),
         'note': 'Use /warmup to initialize Space connection if not connected'
     })
 
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 only with a verified Space client and a closed circuit, 503 otherwise"""
+    with _client_lock:
+        client, init_time = _client, _client_init_time
+    circuit_state = _space_breaker.state
+
+    reasons = []
+    if client is None:
+        reasons.append('no verified Space client yet (hit /warmup)')
+    if circuit_state != CLOSED:
+        reasons.append(f'circuit is {circuit_state}')
+
+    return jsonify({
+        'ready': not reasons,
+        'client_status': 'connected' if client is not None else 'not_initialized',
+        'client_age_seconds': round(time.time() - init_time, 0) if client is not None else None,
+        'circuit': circuit_state,
+        'warmup': warmup_status()['state'],
+        'worker': worker_status(),
+        'reasons': reasons
+    }), 200 if not reasons else 503
+
+
 @app.route('/', methods=['GET'])
 def home():
     """API documentation"""
@@ -318,13 +976,17 @@ def home():
         'endpoints': {
             '/': 'GET - API documentation',
             '/health': 'GET - Health check',
-            '/warmup': 'GET - Warmup Space connection (recommended before first use)',
+            '/ready': 'GET - Readiness probe (200 once the Space client is connected and the circuit is closed)',
+            '/metrics': 'GET - Prometheus metrics',
+            '/warmup': 'GET - Start warming up the Space connection in the background (returns 202)',
+            '/warmup/status': 'GET - Warmup progress (idle, connecting, verifying, ready, failed)',
             '/classify': 'POST - Classify single text',
             '/classify/batch': 'POST - Classify multiple texts'
         },
         'usage': {
             'step_1': 'First, hit /warmup to wake up the Space (may take 30-60 seconds)',
-            'step_2': 'Then use /classify to classify your text'
+            'step_2': 'Poll /warmup/status until the state is ready',
+            'step_3': 'Then use /classify to classify your text'
         },
         'example_request': {
             'url': '/classify',
@@ -338,8 +1000,6 @@ def home():
 
 
 if __name__ == '__main__':
-    import os
-
     port = int(os.environ.get('PORT', 5000))
     logger.info(f"🚀 Starting server on port {port}")
     logger.info(f"📡 Using Space: {SPACE_NAME}")
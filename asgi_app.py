@@ -0,0 +1,506 @@
+# ASGI variant of app.py with the same endpoints and response contract.
+# Upstream calls go to the Space's HTTP API through a shared httpx.AsyncClient,
+# so a single process can hold many in-flight predictions at once.
+#
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 10000
+#   gunicorn asgi_app:app -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+import asyncio
+import httpx
+import json
+import logging
+import os
+import time
+
+from prediction import build_response, is_cacheable, parse_space_result
+from result_cache import ResultCache, normalize_text
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SPACE_NAME = "Anurag3703/bert-spam-classifier-demo"
+SPACE_URL = os.environ.get('SPACE_URL', f"https://{SPACE_NAME.replace('/', '-').lower()}.hf.space")
+
+# Connection limits for the shared upstream client
+UPSTREAM_MAX_CONNECTIONS = int(os.environ.get('UPSTREAM_MAX_CONNECTIONS', 1000))
+UPSTREAM_MAX_KEEPALIVE = int(os.environ.get('UPSTREAM_MAX_KEEPALIVE', 100))
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 10))
+UPSTREAM_READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 120))
+
+CACHE_MAX_SIZE = int(os.environ.get('CACHE_MAX_SIZE', 10000))
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', 3600))
+BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', 8))
+
+# The connection is re-verified in the background once it is CLIENT_TTL_SECONDS - CLIENT_REFRESH_AHEAD_SECONDS
+# old; requests keep being served meanwhile
+CLIENT_TTL_SECONDS = float(os.environ.get('CLIENT_TTL_SECONDS', 300))
+CLIENT_REFRESH_AHEAD_SECONDS = float(os.environ.get('CLIENT_REFRESH_AHEAD_SECONDS', 60))
+CLIENT_REFRESH_RETRY_SECONDS = float(os.environ.get('CLIENT_REFRESH_RETRY_SECONDS', 30))
+
+_http = None
+_connect_task = None
+_client_init_time = None
+_refresh_task = None
+_refresh_state = {
+    'refreshes': 0,
+    'failures': 0,
+    'last_attempt_at': None,
+    'last_error': None
+}
+_result_cache = ResultCache(max_size=CACHE_MAX_SIZE, ttl=CACHE_TTL_SECONDS)
+_in_flight = {}
+
+# Background warmup progress: idle -> connecting -> verifying -> ready | failed
+_warmup_task = None
+_warmup_state = {
+    'state': 'idle',
+    'attempt': 0,
+    'started_at': None,
+    'finished_at': None,
+    'error': None
+}
+
+
+async def space_predict(text):
+    """Run one prediction through the Space's /call/predict HTTP API"""
+    response = await _http.post(f"{SPACE_URL}/call/predict", json={"data": [text]})
+    response.raise_for_status()
+    event_id = response.json()['event_id']
+
+    # The result is delivered as a server-sent event stream
+    async with _http.stream('GET', f"{SPACE_URL}/call/predict/{event_id}") as stream:
+        stream.raise_for_status()
+        event = None
+        async for line in stream.aiter_lines():
+            if line.startswith('event:'):
+                event = line[len('event:'):].strip()
+            elif line.startswith('data:'):
+                data = line[len('data:'):].strip()
+                if event == 'complete':
+                    return json.loads(data)[0]
+                if event == 'error':
+                    raise Exception(f"Space returned an error: {data}")
+
+    raise Exception("Space closed the result stream without a result")
+
+
+async def get_client(max_retries=3, retry_delay=10, force=False, on_progress=None, full_verify=False):
+    """
+    Make sure the Space is awake and verified, retrying while it wakes up
+
+    A verified connection is used without waiting on anything; once it is
+    CLIENT_TTL_SECONDS - CLIENT_REFRESH_AHEAD_SECONDS old it is re-checked in
+    the background. Without one, every caller awaits one shared connection
+    task; with force=True (warmup) a new one is started even if the
+    connection is verified. The previous verification time stands until the
+    new connection is verified, so a warmup never holds up requests.
+
+    New connections are checked with a cheap liveness probe (the Space's
+    /config); full_verify=True (warmup) runs a real test prediction instead.
+    on_progress, if given, is called as on_progress(stage, attempt) with stage
+    'connecting' or 'verifying'.
+    """
+    global _connect_task
+
+    if not force and _client_init_time:
+        if time.time() - _client_init_time >= CLIENT_TTL_SECONDS - CLIENT_REFRESH_AHEAD_SECONDS:
+            _start_client_refresh()
+        return
+
+    if _connect_task is None or _connect_task.done():
+        _connect_task = asyncio.ensure_future(_connect_with_retry(max_retries, retry_delay, on_progress, full_verify))
+    await asyncio.shield(_connect_task)
+
+
+async def _verify_space(full_verify=False, on_progress=None, attempt=1):
+    """Fetch the Space config (what gradio_client.Client does on connect) and optionally run a test prediction"""
+    if on_progress:
+        on_progress('connecting', attempt)
+    response = await _http.get(f"{SPACE_URL}/config")
+    response.raise_for_status()
+    response.json()
+
+    if full_verify:
+        if on_progress:
+            on_progress('verifying', attempt)
+        await space_predict("test")
+
+
+async def _connect_with_retry(max_retries, retry_delay, on_progress, full_verify):
+    """Connect to and verify the Space, retrying while it wakes up; one at a time"""
+    global _client_init_time
+
+    for attempt in range(max_retries):
+        try:
+            logger.info(f"Connecting to Space (attempt {attempt + 1}/{max_retries}): {SPACE_NAME}")
+            await _verify_space(full_verify, on_progress, attempt + 1)
+            _client_init_time = time.time()
+            logger.info("✅ Connected and verified Space successfully!")
+            return
+        except Exception as e:
+            logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
+            if attempt < max_retries - 1:
+                wait_time = retry_delay * (attempt + 1)
+                logger.info(f"Retrying in {wait_time} seconds...")
+                await asyncio.sleep(wait_time)
+            else:
+                raise Exception(
+                    f"Could not connect to Space after {max_retries} attempts. "
+                    "The Space might be sleeping or unavailable. Please try /warmup first."
+                )
+
+
+def _start_client_refresh():
+    """Start a background re-check unless one is running or the last one failed too recently"""
+    global _refresh_task
+
+    if _refresh_task is not None and not _refresh_task.done():
+        return
+    last_attempt = _refresh_state['last_attempt_at']
+    if _refresh_state['last_error'] and last_attempt and time.time() - last_attempt < CLIENT_REFRESH_RETRY_SECONDS:
+        return
+    _refresh_state['last_attempt_at'] = time.time()
+    _refresh_task = asyncio.ensure_future(_refresh_client())
+
+
+async def _refresh_client():
+    """Re-verify the Space with a liveness probe; requests keep being served meanwhile"""
+    global _client_init_time
+
+    try:
+        await _verify_space()
+        _client_init_time = time.time()
+        _refresh_state['refreshes'] += 1
+        _refresh_state['last_error'] = None
+    except Exception as e:
+        logger.warning(f"Background Space refresh failed: {str(e)}")
+        _refresh_state['failures'] += 1
+        _refresh_state['last_error'] = str(e)
+
+
+async def predict_text(text, max_retries=3):
+    """Run a prediction through the result cache, coalescing identical in-flight texts"""
+    cache_key = normalize_text(text)
+    result = _result_cache.get(cache_key)
+    if result is not None:
+        return result
+
+    task = _in_flight.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(_predict_upstream(text, cache_key, max_retries))
+        _in_flight[cache_key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(cache_key, None))
+    return await asyncio.shield(task)
+
+
+async def _predict_upstream(text, cache_key, max_retries):
+    """Call the Space with retry and store a usable result in the cache"""
+    for attempt in range(max_retries):
+        try:
+            result = await space_predict(text)
+            break
+        except Exception as e:
+            logger.warning(f"Prediction attempt {attempt + 1} failed: {str(e)}")
+            if attempt < max_retries - 1:
+                await asyncio.sleep(5 * (attempt + 1))
+            else:
+                raise Exception(f"Prediction failed after {max_retries} attempts: {str(e)}")
+
+    # An answer we can't parse is returned (and reported) but never pinned in the cache
+    if is_cacheable(result):
+        _result_cache.set(cache_key, result)
+    return result
+
+
+async def classify(request):
+    """Classify text as spam or ham using your HF Space"""
+    try:
+        data = await request.json()
+        text = data.get('text', '').strip()
+
+        if not text:
+            return JSONResponse({'error': 'No text provided'}, status_code=400)
+
+        logger.info(f"Classifying text: '{text[:50]}...'")
+
+        try:
+            await get_client()
+        except Exception as e:
+            return JSONResponse({
+                'error': str(e),
+                'suggestion': 'Try hitting the /warmup endpoint first to wake up the Space',
+                'status': 'space_unavailable'
+            }, status_code=503)
+
+        result = await predict_text(text)
+
+        try:
+            parsed = parse_space_result(result)
+            if parsed is None:
+                logger.error(f"Unexpected result format: {result}")
+                return JSONResponse({
+                    'error': 'Unexpected response format from model',
+                    'raw_result': str(result)
+                }, status_code=500)
+
+            response = build_response(text, *parsed)
+
+            logger.info(f"Result: {response['label']} ({response['confidence']:.2%} confidence)")
+            return JSONResponse(response)
+
+        except Exception as e:
+            logger.error(f"Error parsing result: {str(e)}")
+            return JSONResponse({
+                'error': 'Failed to parse model output',
+                'details': str(e),
+                'raw_result': str(result)
+            }, status_code=500)
+
+    except Exception as e:
+        logger.error(f"Error during classification: {str(e)}")
+        return JSONResponse({
+            'error': str(e),
+            'message': 'Classification failed. The Space might be sleeping. Please try /warmup first.'
+        }, status_code=500)
+
+
+async def classify_batch(request):
+    """Classify multiple texts at once"""
+    try:
+        data = await request.json()
+        texts = data.get('texts', [])
+
+        if not texts or not isinstance(texts, list):
+            return JSONResponse({'error': 'Please provide a list of texts'}, status_code=400)
+
+        try:
+            await get_client()
+        except Exception as e:
+            return JSONResponse({
+                'error': str(e),
+                'suggestion': 'Try hitting the /warmup endpoint first'
+            }, status_code=503)
+
+        semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+        async def classify_item(text):
+            async with semaphore:
+                try:
+                    result = await predict_text(text, max_retries=1)
+
+                    spam_conf = next((item['confidence'] for item in result['confidences']
+                                      if 'Spam' in item['label']), 0)
+                    ham_conf = next((item['confidence'] for item in result['confidences']
+                                     if 'Ham' in item['label']), 0)
+
+                    return {
+                        'text': text,
+                        'label': "spam" if spam_conf > ham_conf else "ham",
+                        'confidence': round(max(spam_conf, ham_conf), 4)
+                    }
+                except Exception as e:
+                    logger.warning(f"Failed to classify text '{text[:30]}...': {str(e)}")
+                    return {
+                        'text': text,
+                        'error': 'Classification failed'
+                    }
+
+        results = await asyncio.gather(*(classify_item(text) for text in texts if text.strip()))
+
+        return JSONResponse({'results': list(results)})
+
+    except Exception as e:
+        logger.error(f"Error during batch classification: {str(e)}")
+        return JSONResponse({
+            'error': str(e),
+            'message': 'Batch classification failed. Please try again.'
+        }, status_code=500)
+
+
+def _set_warmup_progress(stage, attempt):
+    _warmup_state['state'] = stage
+    _warmup_state['attempt'] = attempt
+
+
+async def _run_warmup():
+    """Reconnect to the Space in the background, recording progress in _warmup_state"""
+    try:
+        await get_client(max_retries=5, retry_delay=15, force=True, on_progress=_set_warmup_progress, full_verify=True)
+        _warmup_state['state'] = 'ready'
+        _warmup_state['finished_at'] = time.time()
+        logger.info(f"✅ Warmup finished in {_warmup_state['finished_at'] - _warmup_state['started_at']:.2f}s")
+    except Exception as e:
+        logger.error(f"Warmup failed: {str(e)}")
+        _warmup_state['state'] = 'failed'
+        _warmup_state['error'] = str(e)
+        _warmup_state['finished_at'] = time.time()
+
+
+def start_warmup():
+    """Start a background warmup unless one is already running; returns True if started"""
+    global _warmup_task
+
+    if _warmup_task is not None and not _warmup_task.done():
+        return False
+
+    _warmup_state.update({
+        'state': 'connecting',
+        'attempt': 0,
+        'started_at': time.time(),
+        'finished_at': None,
+        'error': None
+    })
+    _warmup_task = asyncio.ensure_future(_run_warmup())
+    return True
+
+
+def warmup_status():
+    """Snapshot of the background warmup progress"""
+    elapsed = None
+    if _warmup_state['started_at']:
+        elapsed = round((_warmup_state['finished_at'] or time.time()) - _warmup_state['started_at'], 2)
+
+    return {
+        'state': _warmup_state['state'],
+        'attempt': _warmup_state['attempt'],
+        'elapsed_seconds': elapsed,
+        'error': _warmup_state['error'],
+        'space': SPACE_NAME
+    }
+
+
+async def warmup(request):
+    """Start warming up the Space connection in the background"""
+    started = start_warmup()
+    if started:
+        logger.info("⏳ Warming up Space connection in the background (this may take 30-60 seconds)...")
+
+    status = warmup_status()
+    status.update({
+        'status': 'accepted',
+        'message': 'Warmup started' if started else 'Warmup already in progress',
+        'status_url': '/warmup/status'
+    })
+    return JSONResponse(status, status_code=202)
+
+
+async def warmup_status_endpoint(request):
+    """Report background warmup progress"""
+    return JSONResponse(warmup_status())
+
+
+async def health(request):
+    """Health check endpoint"""
+    client_status = "connected" if _client_init_time is not None else "not_initialized"
+
+    return JSONResponse({
+        'status': 'healthy',
+        'space': SPACE_NAME,
+        'space_url': SPACE_URL,
+        'client_status': client_status,
+        'client_age_seconds': round(time.time() - _client_init_time, 0) if _client_init_time else None,
+        'client_refresh': {
+            'refreshes': _refresh_state['refreshes'],
+            'failures': _refresh_state['failures'],
+            'last_error': _refresh_state['last_error'],
+            'ttl_seconds': CLIENT_TTL_SECONDS,
+            'refresh_ahead_seconds': CLIENT_REFRESH_AHEAD_SECONDS
+        },
+        'cache': _result_cache.stats(),
+        'in_flight_predictions': len(_in_flight),
+        'note': 'Use /warmup to initialize Space connection if not connected'
+    })
+
+
+async def ready(request):
+    """Readiness probe: 200 once the Space connection has been verified, 503 until then"""
+    init_time = _client_init_time
+
+    reasons = []
+    if init_time is None:
+        reasons.append('no verified Space connection yet (hit /warmup)')
+
+    return JSONResponse({
+        'ready': not reasons,
+        'client_status': 'connected' if init_time is not None else 'not_initialized',
+        'client_age_seconds': round(time.time() - init_time, 0) if init_time is not None else None,
+        'warmup': _warmup_state['state'],
+        'reasons': reasons
+    }, status_code=200 if not reasons else 503)
+
+
+async def home(request):
+    """API documentation"""
+    return JSONResponse({
+        'name': 'BERT Spam Classifier API',
+        'version': '1.1',
+        'space': SPACE_NAME,
+        'serving_mode': 'asgi',
+        'endpoints': {
+            '/': 'GET - API documentation',
+            '/health': 'GET - Health check',
+            '/ready': 'GET - Readiness probe (200 once the Space connection is verified)',
+            '/warmup': 'GET - Start warming up the Space connection in the background (returns 202)',
+            '/warmup/status': 'GET - Warmup progress (idle, connecting, verifying, ready, failed)',
+            '/classify': 'POST - Classify single text',
+            '/classify/batch': 'POST - Classify multiple texts'
+        },
+        'usage': {
+            'step_1': 'First, hit /warmup to wake up the Space (may take 30-60 seconds)',
+            'step_2': 'Poll /warmup/status until the state is ready',
+            'step_3': 'Then use /classify to classify your text'
+        }
+    })
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _http
+
+    _http = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE
+        ),
+        timeout=httpx.Timeout(UPSTREAM_READ_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT)
+    )
+    try:
+        yield
+    finally:
+        await _http.aclose()
+
+
+app = Starlette(
+    routes=[
+        Route('/classify', classify, methods=['POST']),
+        Route('/classify/batch', classify_batch, methods=['POST']),
+        Route('/warmup', warmup, methods=['GET']),
+        Route('/warmup/status', warmup_status_endpoint, methods=['GET']),
+        Route('/health', health, methods=['GET']),
+        Route('/ready', ready, methods=['GET']),
+        Route('/', home, methods=['GET'])
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=['*'],
+            allow_methods=['GET', 'POST', 'OPTIONS'],
+            allow_headers=['Content-Type', 'Authorization']
+        )
+    ],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 5000))
+    logger.info(f"🚀 Starting ASGI server on port {port}")
+    logger.info(f"📡 Using Space: {SPACE_NAME}")
+    uvicorn.run(app, host='0.0.0.0', port=port)
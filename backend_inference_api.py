@@ -1,9 +1,29 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import requests
 import logging
-import time
 import os
+import time
+import requests
+
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from backoff import Backoff, retry_hint
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from concurrency_limiter import AdaptiveLimiter, LimitExceeded
+from deadline import Deadline, DeadlineExceeded, remaining_or, sleep_within
+from http_session import PooledSession
+from load_shedder import LoadShedder, shed_load
+from metrics import (
+    PARSE, QUEUE_WAIT, RETRY_SLEEP, SERIALIZE, UPSTREAM, current_timings, instrument, record, shared_timings,
+    stage
+)
+from micro_batcher import MicroBatcher
+from result_cache import normalize_text
+from rolling_stats import RollingStats
+from retry_policy import (
+    RATE_LIMITED, RetryStats, TIMEOUT, UPSTREAM_UNAVAILABLE, classify_error, classify_status, is_retryable
+)
+from single_flight import SingleFlight
 
 app = Flask(__name__)
 
@@ -26,33 +46,232 @@ if not HF_TOKEN:
     raise ValueError("HF_TOKEN must be set as environment variable")
 # Use Inference API instead of Space
 MODEL_NAME = "Anurag3703/bert-spam-classifier"
-API_URL = f"https://api-inference.huggingface.co/models/{MODEL_NAME}"
+# HF_API_URL can point at a local stand-in server for testing
+API_URL = os.environ.get('HF_API_URL', f"https://api-inference.huggingface.co/models/{MODEL_NAME}")
 
 
 headers = {"Authorization": f"Bearer {HF_TOKEN}"}
 
+# Keep-alive connections to the Inference API, reused across requests
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 10))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 60))
+_http = PooledSession(
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    connect_timeout=HTTP_CONNECT_TIMEOUT,
+    read_timeout=HTTP_READ_TIMEOUT,
+    headers=headers
+)
+
+# Time budget per request; callers can ask for less (or more, up to the max) via X-Request-Timeout
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get('REQUEST_TIMEOUT_SECONDS', 120))
+MAX_REQUEST_TIMEOUT_SECONDS = float(os.environ.get('MAX_REQUEST_TIMEOUT_SECONDS', 290))
+
+# Fail fast while the Inference API is known to be down
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_RECOVERY_SECONDS = float(os.environ.get('CIRCUIT_RECOVERY_SECONDS', 30))
+_inference_breaker = CircuitBreaker(
+    'inference_api',
+    failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+    recovery_timeout=CIRCUIT_RECOVERY_SECONDS
+)
+
+# Retry waits follow the API's hints (Retry-After, estimated_time) and are capped in total
+BACKOFF_BASE_SECONDS = float(os.environ.get('BACKOFF_BASE_SECONDS', 1))
+BACKOFF_MAX_DELAY_SECONDS = float(os.environ.get('BACKOFF_MAX_DELAY_SECONDS', 30))
+BACKOFF_MAX_TOTAL_WAIT_SECONDS = float(os.environ.get('BACKOFF_MAX_TOTAL_WAIT_SECONDS', 120))
+BACKOFF_JITTER = float(os.environ.get('BACKOFF_JITTER', 0.1))
 
-def query_model(text, max_retries=5):
-    """Query the model with retry logic for loading"""
+
+def new_backoff():
+    return Backoff(
+        base=BACKOFF_BASE_SECONDS,
+        max_delay=BACKOFF_MAX_DELAY_SECONDS,
+        max_total_wait=BACKOFF_MAX_TOTAL_WAIT_SECONDS,
+        jitter=BACKOFF_JITTER
+    )
+
+
+# Upstream errors by category; only retryable categories go through the backoff schedule
+_retry_stats = RetryStats()
+
+# Upstream latency percentiles and error/retry rates over the last 1, 5 and 15 minutes
+_upstream_stats = RollingStats(windows=(60, 300, 900))
+
+# Single /classify calls are merged into batched upstream requests
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 10))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 2))
+
+# Adaptive (AIMD) limit on batches in flight to the Inference API; the batch workers bound it from above
+UPSTREAM_LIMIT_MIN = int(os.environ.get('UPSTREAM_LIMIT_MIN', 1))
+UPSTREAM_LIMIT_MAX = int(os.environ.get('UPSTREAM_LIMIT_MAX', BATCH_WORKERS))
+UPSTREAM_LIMIT_TOLERANCE = float(os.environ.get('UPSTREAM_LIMIT_TOLERANCE', 3))
+_inference_limiter = AdaptiveLimiter(
+    name='inference-api',
+    initial_limit=UPSTREAM_LIMIT_MAX,
+    min_limit=UPSTREAM_LIMIT_MIN,
+    max_limit=UPSTREAM_LIMIT_MAX,
+    tolerance=UPSTREAM_LIMIT_TOLERANCE,
+    is_overload=lambda error: classify_error(error) in (TIMEOUT, RATE_LIMITED, UPSTREAM_UNAVAILABLE)
+)
+
+
+def query_model_batch(texts, max_retries=5, deadline=None):
+    """Query the model for a list of texts, returning one prediction list per text"""
+    backoff = new_backoff()
     for attempt in range(max_retries):
-        response = requests.post(API_URL, headers=headers, json={"inputs": text})
-
-        if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 503:
-            # Model is loading
-            wait_time = 10 * (attempt + 1)  # Exponential backoff
-            logger.info(f"Model loading... waiting {wait_time}s (attempt {attempt + 1}/{max_retries})")
-            time.sleep(wait_time)
+        hint = None
+        if deadline:
+            deadline.check("Inference API call")
+        _inference_breaker.before_call()
+        read_timeout = min(HTTP_READ_TIMEOUT, remaining_or(deadline, HTTP_READ_TIMEOUT))
+        try:
+            response = _limited_post(texts, read_timeout, deadline, retry=attempt > 0)
+        except LimitExceeded:
+            _inference_breaker.release()
+            raise DeadlineExceeded(f"Request timed out after {deadline.timeout}s (waiting for an upstream slot)")
+        except requests.exceptions.ReadTimeout as e:
+            if read_timeout < HTTP_READ_TIMEOUT:
+                # Our budget ran out first; that says nothing about the API's health
+                _inference_breaker.release()
+                raise DeadlineExceeded(f"Request timed out after {deadline.timeout}s (waiting for the Inference API)")
+            _inference_breaker.record_failure()
+            error, category = e, TIMEOUT
+        except Exception as e:
+            _inference_breaker.record_failure()
+            error, category = e, classify_error(e)
         else:
-            logger.error(f"API error: {response.status_code} - {response.text}")
-            raise Exception(f"API returned {response.status_code}")
+            if response.status_code == 200:
+                _inference_breaker.record_success()
+                with stage(PARSE):
+                    results = response.json()
+                    # A single input may come back unwrapped: [{"label": ..., "score": ...}, ...]
+                    if len(texts) == 1 and results and isinstance(results[0], dict):
+                        results = [results]
+                return results
+
+            category = classify_status(response.status_code)
+            error = Exception(f"API returned {response.status_code}")
+            hint = retry_hint(response)
+            # The API answered, so only unavailability counts against the circuit
+            if category == UPSTREAM_UNAVAILABLE:
+                _inference_breaker.record_failure()
+            else:
+                _inference_breaker.record_success()
+            if response.status_code != 503:
+                logger.error(f"API error: {response.status_code} - {response.text}")
 
-    raise Exception("Model failed to load after multiple attempts")
+        wait_time = backoff.next_delay(hint) if is_retryable(category) and attempt < max_retries - 1 else None
+        _retry_stats.record(category, retried=wait_time is not None)
+        if not is_retryable(category):
+            raise error
+        if wait_time is None:
+            break
+        # 503 means the model is loading; its body says for how long
+        logger.info(f"Upstream {category}, waiting {wait_time:.1f}s (attempt {attempt + 1}/{max_retries}, hint={hint})")
+        with stage(RETRY_SLEEP):
+            sleep_within(wait_time, deadline, "Inference API call")
+
+    raise Exception(f"Model failed to load after multiple attempts ({category}): {str(error)}")
+
+
+def _limited_post(texts, read_timeout, deadline, retry=False):
+    """POST a batch to the Inference API holding a concurrency-limiter slot, recording it in the rolling stats"""
+    with _inference_limiter.slot(timeout=remaining_or(deadline)) as slot:
+        start = time.perf_counter()
+        try:
+            with stage(UPSTREAM):
+                response = _http.post(API_URL, json={"inputs": texts}, timeout=(HTTP_CONNECT_TIMEOUT, read_timeout))
+        except requests.exceptions.ReadTimeout:
+            if read_timeout < HTTP_READ_TIMEOUT:
+                # Cut short by our own deadline, not a sign of overload
+                slot.ignore()
+            else:
+                _upstream_stats.record_call(time.perf_counter() - start, error=True, retry=retry)
+            raise
+        except Exception:
+            _upstream_stats.record_call(time.perf_counter() - start, error=True, retry=retry)
+            raise
+        _upstream_stats.record_call(time.perf_counter() - start, error=response.status_code != 200, retry=retry)
+        if classify_status(response.status_code) in (RATE_LIMITED, UPSTREAM_UNAVAILABLE):
+            slot.drop()
+        elif response.status_code != 200:
+            slot.ignore()
+    return response
+
+
+def _query_batch_items(items):
+    """
+    Micro-batcher callback: items are (text, deadline, timings, queued_at); retry as long as any caller still waits
+
+    Each caller's timings get its own wait in the batcher queue plus the stages of the shared upstream call.
+    """
+    started = time.perf_counter()
+    for _, _, timings, queued_at in items:
+        if timings is not None:
+            timings.add(QUEUE_WAIT, started - queued_at)
+
+    texts = [text for text, _, _, _ in items]
+    # Every caller in the batch waited for the whole upstream call
+    with shared_timings([timings for _, _, timings, _ in items]):
+        return query_model_batch(texts, deadline=Deadline.latest([deadline for _, deadline, _, _ in items]))
+
+
+_batcher = MicroBatcher(
+    _query_batch_items,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    workers=BATCH_WORKERS
+)
+
+# Reject new /classify requests with 429 once too many are pending or they have been getting slow;
+# at most GUNICORN_THREADS - 1 requests, so a thread stays free for /health and quick 429s
+SHED_MAX_PENDING = int(os.environ.get('SHED_MAX_PENDING', 64))
+SHED_MAX_REQUESTS = int(os.environ.get('SHED_MAX_REQUESTS', max(1, int(os.environ.get('GUNICORN_THREADS', 8)) - 1)))
+SHED_MAX_LATENCY_SECONDS = float(os.environ.get('SHED_MAX_LATENCY_SECONDS', 30))
+_load_shedder = LoadShedder(
+    name='classifier',
+    max_pending=SHED_MAX_PENDING,
+    max_requests=SHED_MAX_REQUESTS,
+    max_latency=SHED_MAX_LATENCY_SECONDS
+)
+
+
+# Prometheus metrics at /metrics: request counts and latencies, per-stage timings, retries, circuit state
+instrument(app, 'inference_api', retry_stats=_retry_stats, breakers=[_inference_breaker], limiters=[_inference_limiter])
+
+# Identical texts that arrive concurrently share one upstream call; if it only ran out of the
+# first caller's time budget, callers with budget left query again. Callers that join another's
+# query record the wait as their upstream time
+_query_flight = SingleFlight(
+    leader_errors=(DeadlineExceeded, FutureTimeoutError), on_wait=lambda seconds: record(UPSTREAM, seconds)
+)
+
+
+def query_model(text, deadline=None):
+    """Query the model for one text via the micro-batcher, coalescing duplicates"""
+    _inference_breaker.check()
+    try:
+        return _query_flight.do(
+            normalize_text(text),
+            lambda: _batcher.submit(
+                (text, deadline, current_timings(), time.perf_counter())
+            ).result(timeout=remaining_or(deadline)),
+            timeout=remaining_or(deadline)
+        )
+    except FutureTimeoutError:
+        raise DeadlineExceeded(f"Request timed out after {deadline.timeout}s (waiting for the Inference API)")
 
 
 @app.route('/classify', methods=['POST'])
+@shed_load(_load_shedder)
 def classify():
+    deadline = Deadline.from_header(
+        request.headers.get('X-Request-Timeout'),
+        default=REQUEST_TIMEOUT_SECONDS,
+        maximum=MAX_REQUEST_TIMEOUT_SECONDS
+    )
     try:
         data = request.get_json()
         text = data.get('text', '').strip()
@@ -62,31 +281,37 @@ def classify():
 
         logger.info(f"Classifying: '{text[:50]}...'")
 
-        result = query_model(text)
-
-        # Parse result format: [[{"label": "LABEL_0", "score": 0.xx}, {...}]]
-        if isinstance(result, list) and len(result) > 0:
-            predictions = result[0]
+        predictions = query_model(text, deadline=deadline)
 
-            spam_score = next(
-                (p['score'] for p in predictions if 'LABEL_1' in p['label'] or 'spam' in p['label'].lower()), 0)
-            ham_score = next(
-                (p['score'] for p in predictions if 'LABEL_0' in p['label'] or 'ham' in p['label'].lower()), 0)
+        # Parse result format: [{"label": "LABEL_0", "score": 0.xx}, {...}]
+        if isinstance(predictions, list) and len(predictions) > 0:
+            with stage(PARSE):
+                spam_score = next(
+                    (p['score'] for p in predictions if 'LABEL_1' in p['label'] or 'spam' in p['label'].lower()), 0)
+                ham_score = next(
+                    (p['score'] for p in predictions if 'LABEL_0' in p['label'] or 'ham' in p['label'].lower()), 0)
 
             label = "spam" if spam_score > ham_score else "ham"
 
-            return jsonify({
-                'text': text,
-                'label': label,
-                'confidence': round(max(spam_score, ham_score), 4),
-                'probabilities': {
-                    'spam': round(spam_score, 4),
-                    'ham': round(ham_score, 4)
-                }
-            })
+            with stage(SERIALIZE):
+                return jsonify({
+                    'text': text,
+                    'label': label,
+                    'confidence': round(max(spam_score, ham_score), 4),
+                    'probabilities': {
+                        'spam': round(spam_score, 4),
+                        'ham': round(ham_score, 4)
+                    }
+                })
         else:
             return jsonify({'error': 'Unexpected response format'}), 500
 
+    except CircuitOpenError as e:
+        response = jsonify({'error': str(e), 'status': 'circuit_open', 'retry_after_seconds': e.retry_after})
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 503
+    except DeadlineExceeded as e:
+        return jsonify({'error': str(e), 'status': 'timeout'}), 504
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -94,7 +319,15 @@ def classify():
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'healthy', 'model': MODEL_NAME})
+    return jsonify({'status': 'healthy', 'model': MODEL_NAME, 'coalescing': _query_flight.stats(),
+                    'batching': _batcher.stats(),
+                    'http_pool': _http.pool_stats(),
+                    'circuit': _inference_breaker.stats(),
+                    'concurrency': _inference_limiter.stats(),
+                    'upstream': {'in_flight': _inference_limiter.stats()['in_flight'],
+                                 'windows': _upstream_stats.snapshot()},
+                    'load_shedding': _load_shedder.stats(),
+                    'upstream_errors': _retry_stats.stats()})
 
 
 @app.route('/', methods=['GET'])
@@ -106,6 +339,7 @@ def home():
         'endpoints': {
             '/': 'GET - API documentation',
             '/health': 'GET - Health check',
+            '/metrics': 'GET - Prometheus metrics',
             '/classify': 'POST - Classify text'
         }
     })
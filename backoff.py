@@ -0,0 +1,73 @@
+import email.utils
+import random
+import time
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def retry_hint(response):
+    """
+    How long the upstream asked us to wait, in seconds, or None
+
+    Uses the Retry-After header when present, otherwise the `estimated_time`
+    the Inference API puts in 503 bodies while the model is loading.
+    """
+    hint = parse_retry_after(response.headers.get('Retry-After'))
+    if hint is not None:
+        return hint
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    if isinstance(body, dict) and isinstance(body.get('estimated_time'), (int, float)):
+        return max(0.0, float(body['estimated_time']))
+    return None
+
+
+class Backoff:
+    """
+    Wait schedule for one retried call
+
+    Without a hint the delay grows exponentially from `base` up to `max_delay`
+    with +/- `jitter` randomisation. A hint from the upstream (Retry-After,
+    estimated_time) is used instead, capped at `max_delay` and only ever
+    stretched by jitter, never shortened. Once the waits would add up to more
+    than `max_total_wait`, next_delay() returns None and the caller gives up.
+    """
+
+    def __init__(self, base=1.0, factor=2.0, max_delay=30.0, max_total_wait=120.0, jitter=0.1):
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.max_total_wait = max_total_wait
+        self.jitter = jitter
+        self.attempt = 0
+        self.total_wait = 0.0
+
+    def next_delay(self, hint=None):
+        if hint is not None:
+            delay = min(hint, self.max_delay) * random.uniform(1.0, 1.0 + self.jitter)
+        else:
+            delay = min(self.base * self.factor ** self.attempt, self.max_delay)
+            delay *= random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+        self.attempt += 1
+
+        if self.total_wait + delay > self.max_total_wait:
+            return None
+        self.total_wait += delay
+        return delay
@@ -0,0 +1,107 @@
+"""
+Time to first successful Inference API call while the model is loading
+
+Compares the old fixed 10s/20s/30s... schedule with the adaptive backoff in
+backend_inference_api.query_model_batch, against a local stand-in server that
+answers 503 {"estimated_time": ...} until the simulated load finishes:
+
+    python benchmarks/bench_backoff.py --load-times 2 5 12
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class LoadingModel:
+    """Answers 503 with an estimated_time until load_time seconds after the first request"""
+
+    def __init__(self, load_time):
+        self.load_time = load_time
+        self.loading_since = None
+        self.requests = 0
+
+    def reset(self):
+        self.loading_since = None
+        self.requests = 0
+
+
+def make_handler(model):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            model.requests += 1
+            if model.loading_since is None:
+                model.loading_since = time.monotonic()
+
+            if time.monotonic() - model.loading_since < model.load_time:
+                self._send(503, {'error': 'Model is currently loading', 'estimated_time': model.load_time})
+            else:
+                inputs = body['inputs'] if isinstance(body['inputs'], list) else [body['inputs']]
+                self._send(200, [[{'label': 'LABEL_0', 'score': 0.9}, {'label': 'LABEL_1', 'score': 0.1}]
+                                 for _ in inputs])
+
+        def _send(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def fixed_schedule(url, texts, max_retries=5):
+    """The previous query_model loop: wait 10 * (attempt + 1) seconds on every 503"""
+    for attempt in range(max_retries):
+        response = requests.post(url, json={"inputs": texts})
+        if response.status_code == 200:
+            return response.json()
+        time.sleep(10 * (attempt + 1))
+    raise Exception("Model failed to load after multiple attempts")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--load-times', type=float, nargs='+', default=[2, 5, 12])
+    args = parser.parse_args()
+
+    model = LoadingModel(0)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(model))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/models/stand-in"
+
+    os.environ.setdefault('HF_TOKEN', 'benchmark')
+    os.environ['HF_API_URL'] = url
+    import backend_inference_api as backend
+    backend.logger.setLevel('WARNING')
+
+    print(f"{'load time (s)':>14} {'schedule':>10} {'ready after (s)':>16} {'requests':>9}")
+    for load_time in args.load_times:
+        model.load_time = load_time
+        for name, query in (('fixed', lambda: fixed_schedule(url, ['hello'])),
+                            ('adaptive', lambda: backend.query_model_batch(['hello']))):
+            model.reset()
+            start = time.perf_counter()
+            query()
+            elapsed = time.perf_counter() - start
+            print(f"{load_time:>14.1f} {name:>10} {elapsed:>16.2f} {model.requests:>9}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Latency of /classify/batch versus batch size and fan-out concurrency
+
+Runs the Flask app in-process against a stand-in Gradio client that sleeps
+for a fixed upstream latency, and a local stand-in for the Space's /config
+(what the liveness probe fetches), so no Space is needed:
+
+    python benchmarks/bench_batch.py --latency 0.2 --sizes 1 10 50 200 --concurrency 1 8 16
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StandInJob:
+    """Mimics gradio_client.Job: result() and cancel() over a Future"""
+
+    def __init__(self, future):
+        self.future = future
+
+    def result(self, timeout=None):
+        return self.future.result(timeout=timeout)
+
+    def cancel(self):
+        return self.future.cancel()
+
+
+class StandInClient:
+    """Mimics gradio_client.Client.submit with a fixed latency"""
+
+    latency = 0.2
+    src = None
+    executor = ThreadPoolExecutor(max_workers=64)
+
+    def __init__(self, *args, **kwargs):
+        self.headers = {}
+        self.ssl_verify = True
+
+    def predict(self, text, api_name=None):
+        time.sleep(self.latency)
+        return {
+            'label': 'Spam',
+            'confidences': [
+                {'label': 'Spam', 'confidence': 0.9},
+                {'label': 'Not Spam (Ham)', 'confidence': 0.1}
+            ]
+        }
+
+    def submit(self, text, api_name=None):
+        return StandInJob(self.executor.submit(self.predict, text, api_name))
+
+
+class ConfigHandler(BaseHTTPRequestHandler):
+    """Answers the liveness probe's GET /config"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def run(sizes, concurrencies, latency):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ConfigHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    StandInClient.src = f"http://127.0.0.1:{server.server_address[1]}/"
+    StandInClient.latency = latency
+
+    # Enough batch clients and upstream slots for the largest fan-out
+    os.environ['BATCH_CLIENT_POOL_SIZE'] = str(max(concurrencies))
+    os.environ['UPSTREAM_LIMIT_MAX'] = str(int(os.environ.get('CLIENT_POOL_SIZE', 4)) + max(concurrencies))
+    import app as classifier_app
+    from bulkhead import Bulkhead
+
+    classifier_app.Client = StandInClient
+    classifier_app.logger.setLevel('WARNING')
+    client = classifier_app.app.test_client()
+
+    # Connect once and wait for the batch pool to fill, so the first row doesn't pay for it
+    classifier_app.get_client()
+    batch_pool = classifier_app._bulkheads[classifier_app.BATCH].pool
+    while batch_pool.stats()['healthy'] < batch_pool.size:
+        time.sleep(0.05)
+
+    print(f"upstream latency: {latency * 1000:.0f} ms")
+    print(f"{'batch size':>10} {'concurrency':>12} {'latency (s)':>12} {'items/s':>10}")
+    for concurrency in concurrencies:
+        classifier_app._bulkheads[classifier_app.BATCH] = Bulkhead(
+            classifier_app.BATCH, workers=concurrency, pool=batch_pool
+        )
+        for size in sizes:
+            # Unique texts so the result cache does not short-circuit upstream calls
+            texts = [f"message {uuid.uuid4()}" for _ in range(size)]
+            start = time.perf_counter()
+            response = client.post('/classify/batch', json={'texts': texts})
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.get_json()
+            failed = [result for result in response.get_json()['results'] if 'error' in result]
+            assert not failed, f"{len(failed)}/{size} items failed, e.g. {failed[0]}"
+            print(f"{size:>10} {concurrency:>12} {elapsed:>12.2f} {size / elapsed:>10.1f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.2, help='simulated upstream latency in seconds')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50, 100, 200])
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, int(os.environ.get('BATCH_MAX_CONCURRENCY', 8))])
+    args = parser.parse_args()
+
+    run(args.sizes, args.concurrency, args.latency)
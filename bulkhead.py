@@ -0,0 +1,61 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Bulkhead:
+    """
+    Worker threads and upstream clients reserved for one class of traffic
+
+    Work submitted here only ever runs on this bulkhead's executor and
+    checks out clients from its own `pool`, so another workload saturating
+    its bulkhead can't take threads or connections from this one.
+    """
+
+    def __init__(self, name, workers, pool):
+        self.name = name
+        self.workers = workers
+        self.pool = pool
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+        self.peak_active = 0
+        self.peak_queued = 0
+        self.completed = 0
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on this bulkhead's workers, in the caller's context, and return its Future"""
+        with self._lock:
+            self._queued += 1
+            self.peak_queued = max(self.peak_queued, self._queued)
+        context = contextvars.copy_context()
+        return self._executor.submit(context.run, self._run, fn, args, kwargs)
+
+    def _run(self, fn, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+            self.peak_active = max(self.peak_active, self._active)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self.completed += 1
+
+    def stats(self):
+        pool = self.pool.stats()
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'active': self._active,
+                'queued': self._queued,
+                'saturation': round(self._active / self.workers, 2),
+                'peak_active': self.peak_active,
+                'peak_queued': self.peak_queued,
+                'completed': self.completed,
+                'clients_in_use': pool['healthy'] - pool['idle'],
+                'client_saturation': round((pool['healthy'] - pool['idle']) / pool['size'], 2) if pool['size'] else None,
+                'client_pool': pool
+            }
@@ -0,0 +1,135 @@
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that is known to be down"""
+
+    def __init__(self, name, retry_after):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} is unavailable (circuit open), retry in {retry_after}s")
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker shared by every call to one upstream
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail immediately with CircuitOpenError. Once `recovery_timeout` seconds have
+    passed it goes half-open and lets a single probe call through: success
+    closes it again, failure re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def _current_state(self):
+        """Resolve open -> half-open once the recovery timeout has passed; caller holds the lock"""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._probe_in_flight = False
+            logger.info(f"Circuit {self.name}: half-open, allowing a probe call")
+        return self._state
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def retry_after(self):
+        """Seconds until the circuit will allow another call (0 if it allows one now)"""
+        with self._lock:
+            if self._current_state() != OPEN:
+                return 0
+            return max(1, math.ceil(self.recovery_timeout - (time.monotonic() - self._opened_at)))
+
+    def check(self):
+        """Raise CircuitOpenError if the circuit is open (does not use up the half-open probe)"""
+        retry_after = self.retry_after()
+        if retry_after:
+            with self._lock:
+                self.rejected += 1
+            raise CircuitOpenError(self.name, retry_after)
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call to the upstream is allowed right now"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+            if state == OPEN:
+                retry_after = max(1, math.ceil(self.recovery_timeout - (time.monotonic() - self._opened_at)))
+            else:
+                retry_after = 1
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"Circuit {self.name}: closed")
+            self._state = CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == HALF_OPEN or (state == CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                self.times_opened += 1
+                logger.warning(
+                    f"Circuit {self.name}: open after {self._consecutive_failures} consecutive failures, "
+                    f"failing fast for {self.recovery_timeout}s"
+                )
+
+    def release(self):
+        """Give back a half-open probe slot without recording an outcome (e.g. the caller gave up)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def call(self, fn, *args, **kwargs):
+        """Call fn through the breaker, recording its outcome"""
+        self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'recovery_timeout_seconds': self.recovery_timeout,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected
+            }
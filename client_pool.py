@@ -0,0 +1,193 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledClient:
+    def __init__(self, client, slot):
+        self.client = client
+        self.slot = slot
+        self.created_at = time.time()
+        self.uses = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.retired = False
+
+
+class ClientPool:
+    """
+    Fixed-size pool of upstream clients with checkout/return semantics
+
+    Clients are created by `factory`. A client that fails `max_failures` times
+    in a row is dropped and replaced from a background thread, so callers never
+    wait on a reconnect; they simply check out one of the remaining clients.
+    Exceptions listed in `ignore_errors` are not held against the client.
+    renew() swaps in fresh clients the same way, one slot at a time.
+    Clients that leave the pool are closed once no caller holds them.
+    """
+
+    def __init__(self, factory, size=4, max_failures=2, replace_delay=5, ignore_errors=(), name="client-pool"):
+        self.factory = factory
+        self.ignore_errors = tuple(ignore_errors)
+        self.size = size
+        self.max_failures = max_failures
+        self.replace_delay = replace_delay
+        self.name = name
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._members = {}
+        # Latest replacement per slot; an older one still retrying gives up once superseded
+        self._replacing = {}
+        self.clients_created = 0
+        self.clients_closed = 0
+        self.replacements = 0
+        self.create_failures = 0
+
+    def renew(self, seed=None):
+        """
+        Replace every client with a new one, optionally starting with `seed`
+
+        Each slot's current client keeps serving until its replacement has
+        been created, so callers never find the pool emptier than before.
+        Replacements still retrying from earlier are superseded.
+        """
+        with self._lock:
+            slots = list(range(self.size))
+            if seed is not None:
+                slot = slots.pop(0)
+                self._replacing.pop(slot, None)
+                self._add(seed, slot)
+
+        for slot in slots:
+            self._spawn_replacement(slot, delay=0)
+
+    def _add(self, client, slot):
+        """Register a client and make it available, retiring the one it replaces; caller holds the lock"""
+        previous = self._members.get(slot)
+        if previous is not None:
+            previous.retired = True
+            with self._idle.mutex:
+                idle = previous in self._idle.queue
+                if idle:
+                    self._idle.queue.remove(previous)
+            # A checked-out client is closed when it comes back
+            if idle:
+                self._close(previous.client)
+        entry = _PooledClient(client, slot)
+        self._members[slot] = entry
+        self._idle.put(entry)
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Borrow a client for the duration of the block, waiting up to `timeout` seconds"""
+        try:
+            entry = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise Exception(f"No upstream client available after {timeout}s")
+
+        try:
+            yield entry.client
+        except Exception as e:
+            self._release(entry, failed=not isinstance(e, self.ignore_errors))
+            raise
+        else:
+            self._release(entry, failed=False)
+
+    def _release(self, entry, failed):
+        with self._lock:
+            entry.uses += 1
+            if failed:
+                entry.failures += 1
+                entry.consecutive_failures += 1
+            else:
+                entry.consecutive_failures = 0
+
+            if entry.retired:
+                # Replaced by renew() while it was checked out
+                self._close(entry.client)
+                return
+
+            if entry.consecutive_failures >= self.max_failures:
+                logger.warning(f"{self.name}: client {entry.slot} failed {entry.consecutive_failures} times, replacing")
+                self._members.pop(entry.slot, None)
+                self.replacements += 1
+                self._close(entry.client)
+                replace = True
+            else:
+                self._idle.put(entry)
+                replace = False
+
+        if replace:
+            self._spawn_replacement(entry.slot, delay=0)
+
+    def _close(self, client):
+        """Close a client that has left the pool, on its own thread since Client.close blocks; caller holds the lock"""
+        self.clients_closed += 1
+        close = getattr(client, 'close', None)
+        if close is not None:
+            threading.Thread(target=close, name=f"{self.name}-close", daemon=True).start()
+
+    def _spawn_replacement(self, slot, delay):
+        ticket = object()
+        with self._lock:
+            self._replacing[slot] = ticket
+        threading.Thread(
+            target=self._replace,
+            args=(slot, ticket, delay),
+            name=f"{self.name}-replace-{slot}",
+            daemon=True
+        ).start()
+
+    def _replace(self, slot, ticket, delay):
+        """Create a client for `slot` in the background, retrying until it succeeds or a newer replacement takes over"""
+        while True:
+            if delay:
+                time.sleep(delay)
+            with self._lock:
+                if self._replacing.get(slot) is not ticket:
+                    return
+            try:
+                client = self.factory()
+            except Exception as e:
+                with self._lock:
+                    self.create_failures += 1
+                logger.warning(f"{self.name}: could not create client {slot}: {str(e)}")
+                delay = self.replace_delay
+                continue
+
+            with self._lock:
+                self.clients_created += 1
+                if self._replacing.get(slot) is ticket:
+                    del self._replacing[slot]
+                    self._add(client, slot)
+                else:
+                    self._close(client)
+            return
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            clients = [
+                {
+                    'slot': entry.slot,
+                    'age_seconds': round(now - entry.created_at, 0),
+                    'uses': entry.uses,
+                    'failures': entry.failures,
+                    'consecutive_failures': entry.consecutive_failures
+                }
+                for entry in sorted(self._members.values(), key=lambda entry: entry.slot)
+            ]
+            return {
+                'size': self.size,
+                'healthy': len(self._members),
+                'idle': self._idle.qsize(),
+                'clients_created': self.clients_created,
+                'clients_closed': self.clients_closed,
+                'replacements': self.replacements,
+                'create_failures': self.create_failures,
+                'clients': clients
+            }
@@ -0,0 +1,209 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class LimitExceeded(Exception):
+    """Raised when no concurrency slot frees up within the caller's wait"""
+
+    def __init__(self, name, limit, waited):
+        self.name = name
+        self.limit = limit
+        self.waited = waited
+        super().__init__(f"{name}: no upstream slot free after {waited:.2f}s (limit {limit})")
+
+
+class _Slot:
+    def __init__(self):
+        self.outcome = None
+
+    def drop(self):
+        """Mark the call as overloaded (rate limited, upstream unavailable) even though it returned"""
+        self.outcome = 'dropped'
+
+    def ignore(self):
+        """Release the slot without letting the call's latency or outcome move the limit"""
+        self.outcome = 'ignored'
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on concurrent upstream calls
+
+    Every call holds a slot for its duration. A call that finishes within
+    `tolerance` times the baseline latency (the fastest call in the current
+    sampling window) grows the limit additively, by about one slot per
+    `limit` such calls, but only while at least half the slots are in use.
+    A slower call, or one that fails with an error for which `is_overload`
+    returns True, shrinks it multiplicatively by `backoff_ratio`, at most
+    once per baseline latency so a burst of failures from the same moment
+    counts once. Other errors release the slot without a sample.
+
+    Callers wait for slots in `lanes`, listed from highest to lowest
+    priority. A free slot goes to the oldest waiter of the highest lane that
+    has one, except that a waiting lower lane gets a slot after being passed
+    over often enough to keep at least `min_share` of the grants.
+    """
+
+    def __init__(self, name="upstream", initial_limit=8, min_limit=1, max_limit=64, tolerance=2.0,
+                 backoff_ratio=0.9, window=100, is_overload=None, lanes=('default',), min_share=0.2):
+        self.name = name
+        self.lanes = tuple(lanes)
+        self.min_share = min_share
+        self._patience = max(0, math.ceil(1 / min_share) - 1) if min_share > 0 else None
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff_ratio = backoff_ratio
+        self.window = window
+        self.is_overload = is_overload or (lambda error: False)
+        self._limit = float(initial_limit)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiters = {lane: deque() for lane in self.lanes}
+        self._passed_over = {lane: 0 for lane in self.lanes}
+        self._lane_stats = {lane: {'granted': 0, 'total_wait': 0.0, 'max_wait': 0.0} for lane in self.lanes}
+        self._baseline = None
+        self._window_min = None
+        self._window_samples = 0
+        self._last_decrease = 0.0
+        self.successes = 0
+        self.drops = 0
+        self.rejections = 0
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def limit(self):
+        with self._cond:
+            return int(self._limit)
+
+    @contextmanager
+    def slot(self, timeout=None, lane=None):
+        """Hold a slot for the duration of the block, waiting up to `timeout` seconds for one in `lane`"""
+        self._acquire(timeout, lane or self.lanes[0])
+        slot = _Slot()
+        start = time.monotonic()
+        try:
+            yield slot
+        except Exception as e:
+            if slot.outcome is None:
+                slot.outcome = 'dropped' if self.is_overload(e) else 'ignored'
+            raise
+        finally:
+            self._release(slot.outcome or 'success', time.monotonic() - start)
+
+    def _acquire(self, timeout, lane):
+        start = time.monotonic()
+        ticket = object()
+        with self._cond:
+            waiters = self._waiters[lane]
+            waiters.append(ticket)
+            while not (self._in_flight < int(self._limit) and waiters[0] is ticket and self._next_lane() == lane):
+                remaining = None if timeout is None else timeout - (time.monotonic() - start)
+                if remaining is not None and remaining <= 0:
+                    waiters.remove(ticket)
+                    self.rejections += 1
+                    # Someone else may be first in line now
+                    self._cond.notify_all()
+                    raise LimitExceeded(self.name, int(self._limit), time.monotonic() - start)
+                self._cond.wait(remaining)
+
+            waiters.popleft()
+            self._in_flight += 1
+            self._grant(lane, time.monotonic() - start)
+            if self._in_flight < int(self._limit):
+                self._cond.notify_all()
+
+    def _next_lane(self):
+        """Lane whose oldest waiter gets the next free slot; caller holds the lock"""
+        waiting = [lane for lane in self.lanes if self._waiters[lane]]
+        if not waiting:
+            return None
+        if self._patience is not None:
+            for lane in waiting[1:]:
+                if self._passed_over[lane] >= self._patience:
+                    return lane
+        return waiting[0]
+
+    def _grant(self, lane, waited):
+        """Record a grant to lane; lower lanes still waiting were passed over; caller holds the lock"""
+        self._passed_over[lane] = 0
+        for other in self.lanes[self.lanes.index(lane) + 1:]:
+            if self._waiters[other]:
+                self._passed_over[other] += 1
+        lane_stats = self._lane_stats[lane]
+        lane_stats['granted'] += 1
+        lane_stats['total_wait'] += waited
+        lane_stats['max_wait'] = max(lane_stats['max_wait'], waited)
+
+    def _release(self, outcome, latency):
+        with self._cond:
+            in_flight = self._in_flight
+            self._in_flight -= 1
+            if outcome == 'success':
+                self.successes += 1
+                self._sample(latency)
+                if latency > self._baseline * self.tolerance:
+                    self._decrease()
+                elif in_flight * 2 >= self._limit:
+                    self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+                    self.increases += 1
+            elif outcome == 'dropped':
+                self.drops += 1
+                self._decrease()
+            self._cond.notify_all()
+
+    def _sample(self, latency):
+        """Track the baseline latency as the minimum of the previous sampling window; caller holds the lock"""
+        self._window_min = latency if self._window_min is None else min(self._window_min, latency)
+        self._window_samples += 1
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        if self._window_samples >= self.window:
+            # Let the baseline drift up if the upstream got slower for good
+            self._baseline = self._window_min
+            self._window_min = None
+            self._window_samples = 0
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < (self._baseline or 0):
+            return
+        self._last_decrease = now
+        previous = self._limit
+        self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+        self.decreases += 1
+        if int(previous) != int(self._limit):
+            logger.info(f"{self.name}: concurrency limit lowered to {int(self._limit)}")
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': int(self._limit),
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'in_flight': self._in_flight,
+                'waiting': sum(len(waiters) for waiters in self._waiters.values()),
+                'baseline_latency_ms': None if self._baseline is None else round(self._baseline * 1000, 1),
+                'successes': self.successes,
+                'drops': self.drops,
+                'rejections': self.rejections,
+                'increases': self.increases,
+                'decreases': self.decreases,
+                'lanes': {
+                    lane: {
+                        'waiting': len(self._waiters[lane]),
+                        'granted': lane_stats['granted'],
+                        'avg_wait_ms': round(lane_stats['total_wait'] / lane_stats['granted'] * 1000, 1)
+                        if lane_stats['granted'] else None,
+                        'max_wait_ms': round(lane_stats['max_wait'] * 1000, 1)
+                    }
+                    for lane, lane_stats in self._lane_stats.items()
+                }
+            }
@@ -0,0 +1,67 @@
+import math
+import time
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's time budget does not allow the next step"""
+
+
+class Deadline:
+    """Time budget for one request, used to bound retries, backoff sleeps and waits"""
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    @classmethod
+    def from_header(cls, value, default, maximum=None):
+        """Build a deadline from an X-Request-Timeout header value (seconds), falling back to default"""
+        try:
+            timeout = float(value) if value else default
+        except (TypeError, ValueError):
+            timeout = default
+        if not math.isfinite(timeout) or timeout <= 0:
+            timeout = default
+        if maximum is not None:
+            timeout = min(timeout, maximum)
+        return cls(timeout)
+
+    @staticmethod
+    def latest(deadlines):
+        """The most generous of several deadlines, or None if any of them is unbounded"""
+        if not deadlines or any(deadline is None for deadline in deadlines):
+            return None
+        return max(deadlines, key=lambda deadline: deadline.expires_at)
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, what="request"):
+        """Raise DeadlineExceeded if the budget is already spent"""
+        if self.expired():
+            raise DeadlineExceeded(f"Request timed out after {self.timeout}s ({what})")
+
+    def sleep(self, seconds, what="retry"):
+        """Sleep before a retry, or raise DeadlineExceeded if the budget can't cover the sleep"""
+        if seconds >= self.remaining():
+            raise DeadlineExceeded(
+                f"Request timed out after {self.timeout}s: "
+                f"not enough time left for a {seconds}s wait before the next {what}"
+            )
+        time.sleep(seconds)
+
+
+def sleep_within(seconds, deadline, what="retry"):
+    """time.sleep, bounded by deadline when there is one"""
+    if deadline is None:
+        time.sleep(seconds)
+    else:
+        deadline.sleep(seconds, what)
+
+
+def remaining_or(deadline, default=None):
+    """Seconds left on deadline, or default when there is no deadline"""
+    return default if deadline is None else deadline.remaining()
@@ -1,12 +1,39 @@
 import os
+import sys
+import time
 
 bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
 workers = 1  # Reduced to 1 for simpler state management
-worker_class = 'sync'
+worker_class = 'gthread'  # Threads let concurrent requests use the Space client pool
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
 timeout = 300  # 5 minutes - long enough for full warmup
 graceful_timeout = 300
 keepalive = 5
 preload_app = False
 accesslog = '-'
 errorlog = '-'
-loglevel = 'info'
\ No newline at end of file
+loglevel = 'info'
+
+# Each worker connects to and verifies the Space in the background as soon as it has loaded the app,
+# so it is warm (see /ready) before it gets traffic instead of the first request paying for the wake-up
+PREWARM_ON_BOOT = os.environ.get('PREWARM_ON_BOOT', 'true').lower() in ('1', 'true', 'yes')
+
+
+def when_ready(server):
+    server.log.info(f"Server ready; workers will {'prewarm' if PREWARM_ON_BOOT else 'not prewarm'} the Space connection")
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.time()
+
+
+def post_worker_init(worker):
+    """Start the app's background warmup without holding up the worker's boot"""
+    if not PREWARM_ON_BOOT:
+        return
+    module = sys.modules.get(getattr(worker.wsgi, 'import_name', ''))
+    start_warmup = getattr(module, 'start_warmup', None)
+    if start_warmup is None:
+        return
+    start_warmup(trigger='startup')
+    worker.log.info(f"Worker {worker.pid} booted in {time.time() - worker.forked_at:.2f}s, prewarming in the background")
@@ -0,0 +1,77 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledSession:
+    """Shared keep-alive HTTP session with a sized connection pool and default timeouts"""
+
+    def __init__(self, pool_maxsize=10, pool_block=True, connect_timeout=5.0, read_timeout=60.0, headers=None):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+        self._adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=0
+        )
+        self._session = requests.Session()
+        self._session.mount('http://', self._adapter)
+        self._session.mount('https://', self._adapter)
+        self._session.headers.update({'Connection': 'keep-alive'})
+        if headers:
+            self._session.headers.update(headers)
+        self._lock = threading.Lock()
+        self._active = 0
+        self.requests = 0
+
+    def request(self, method, url, **kwargs):
+        """Send a request on the pooled session, applying the default timeouts"""
+        kwargs.setdefault('timeout', self.timeout)
+        with self._lock:
+            self._active += 1
+            self.requests += 1
+        try:
+            return self._session.request(method, url, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def pool_stats(self):
+        """Connection pool statistics summed over every host the session has talked to"""
+        opened = 0
+        served = 0
+        idle = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            served += pool.num_requests
+            # Unused slots are represented by None placeholders in the LIFO queue
+            idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+
+        with self._lock:
+            active = self._active
+
+        return {
+            'pool_maxsize': self.pool_maxsize,
+            'connect_timeout_seconds': self.timeout[0],
+            'read_timeout_seconds': self.timeout[1],
+            'active': active,
+            'idle': idle,
+            'connections_opened': opened,
+            'requests': served,
+            'reused': max(served - opened, 0)
+        }
+
+    def close(self):
+        self._session.close()
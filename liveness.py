@@ -0,0 +1,59 @@
+import threading
+import time
+import urllib.parse
+
+import httpx
+
+PROBE = 'probe'
+FULL_INFERENCE = 'full_inference'
+
+
+def probe_space(client, timeout=10.0):
+    """
+    Cheap liveness check for a connected Gradio client
+
+    Fetches the Space's /config, which the Gradio server answers without
+    touching the model, and raises if the Space is not serving.
+    """
+    url = urllib.parse.urljoin(client.src, 'config')
+    response = httpx.get(url, headers=client.headers, timeout=timeout, verify=client.ssl_verify)
+    response.raise_for_status()
+    response.json()
+
+
+class VerificationStats:
+    """Latency of cheap liveness probes versus full test inferences"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {PROBE: [0, 0.0], FULL_INFERENCE: [0, 0.0]}
+
+    def timed(self, kind, fn, *args, **kwargs):
+        """Run fn and record its latency under kind ('probe' or 'full_inference') if it succeeds"""
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._totals[kind][0] += 1
+            self._totals[kind][1] += elapsed
+        return result
+
+    def stats(self):
+        with self._lock:
+            averages = {
+                kind: (total / count * 1000 if count else None)
+                for kind, (count, total) in self._totals.items()
+            }
+            counts = {kind: count for kind, (count, _) in self._totals.items()}
+
+        saved = None
+        if averages[PROBE] is not None and averages[FULL_INFERENCE] is not None:
+            saved = round(averages[FULL_INFERENCE] - averages[PROBE], 1)
+
+        return {
+            'probes': counts[PROBE],
+            'avg_probe_ms': None if averages[PROBE] is None else round(averages[PROBE], 1),
+            'full_inferences': counts[FULL_INFERENCE],
+            'avg_full_inference_ms': None if averages[FULL_INFERENCE] is None else round(averages[FULL_INFERENCE], 1),
+            'estimated_saved_ms_per_reconnect': saved
+        }
@@ -0,0 +1,146 @@
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import jsonify
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when new work is rejected to protect the work already admitted"""
+
+    def __init__(self, name, reason, retry_after):
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"{name} is overloaded ({reason}), retry in {retry_after}s")
+
+
+class TooLarge(Exception):
+    """Raised for a request whose work alone exceeds what the shedder ever admits"""
+
+    def __init__(self, name, cost, max_pending):
+        self.name = name
+        self.cost = cost
+        self.max_pending = max_pending
+        super().__init__(f"{name} admits at most {max_pending} texts at a time, got {cost}")
+
+
+class LoadShedder:
+    """
+    Admission control for request handlers based on pending work and latency
+
+    Work is counted in units (one per text). New work is rejected with
+    Overloaded once admitting it would put more than `max_pending` units or
+    `max_requests` requests in flight, or while work is pending and the
+    moving average of request latency is above `max_latency` seconds. With
+    nothing pending, work is always admitted, so the latency average
+    recovers once the backlog clears. A request costing more than
+    `max_pending` on its own is never admitted (TooLarge).
+    """
+
+    def __init__(self, name="server", max_pending=64, max_requests=None, max_latency=30.0, alpha=0.2,
+                 max_retry_after=60):
+        self.name = name
+        self.max_pending = max_pending
+        self.max_requests = max_requests
+        self.max_latency = max_latency
+        self.alpha = alpha
+        self.max_retry_after = max_retry_after
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._requests = 0
+        self._latency = None
+        self.admitted = 0
+        self.shed = {'pending': 0, 'requests': 0, 'latency': 0, 'too_large': 0}
+
+    @contextmanager
+    def admit(self, cost=1):
+        """Hold `cost` units of pending work for the duration of the block, or raise Overloaded or TooLarge"""
+        with self._lock:
+            if cost > self.max_pending:
+                self.shed['too_large'] += 1
+                raise TooLarge(self.name, cost, self.max_pending)
+            reason = None
+            if self._pending + cost > self.max_pending and self._pending:
+                reason = 'pending'
+            elif self.max_requests is not None and self._requests >= self.max_requests:
+                reason = 'requests'
+            elif self._pending and self._latency is not None and self._latency > self.max_latency:
+                reason = 'latency'
+            if reason:
+                self.shed[reason] += 1
+                raise Overloaded(self.name, reason, self._retry_after())
+            self._pending += cost
+            self._requests += 1
+            self.admitted += 1
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._pending -= cost
+                self._requests -= 1
+                if self._latency is None:
+                    self._latency = elapsed
+                else:
+                    self._latency += self.alpha * (elapsed - self._latency)
+
+    def _retry_after(self):
+        """Whole seconds a rejected caller should wait: about one current request latency; caller holds the lock"""
+        latency = self._latency or 1.0
+        return int(min(self.max_retry_after, max(1, math.ceil(latency))))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'requests': self._requests,
+                'max_requests': self.max_requests,
+                'avg_latency_seconds': None if self._latency is None else round(self._latency, 3),
+                'max_latency_seconds': self.max_latency,
+                'admitted': self.admitted,
+                'shed': dict(self.shed)
+            }
+
+
+def shed_load(shedder, cost=lambda: 1):
+    """
+    Decorator running a Flask view under `shedder`'s admission control
+
+    cost() gives the current request's units of work. Overloaded requests
+    get a 429 with Retry-After, requests too large to ever be admitted a 413.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                with shedder.admit(cost=cost()):
+                    return view(*args, **kwargs)
+            except TooLarge as e:
+                logger.warning(f"Rejecting request: {str(e)}")
+                return jsonify({
+                    'error': str(e),
+                    'status': 'too_large',
+                    'max_texts': e.max_pending,
+                    'suggestion': 'Split the texts into smaller requests.'
+                }), 413
+            except Overloaded as e:
+                logger.warning(f"Shedding request: {str(e)}")
+                response = jsonify({
+                    'error': str(e),
+                    'status': 'overloaded',
+                    'retry_after_seconds': e.retry_after,
+                    'suggestion': 'The server is busy. Retry after the indicated delay.'
+                })
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response, 429
+        return wrapper
+    return decorator
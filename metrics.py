@@ -0,0 +1,214 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Stages of a classification, timed separately
+CLIENT_ACQUIRE = 'client_acquire'
+QUEUE_WAIT = 'queue_wait'
+UPSTREAM = 'upstream'
+RETRY_SLEEP = 'retry_sleep'
+PARSE = 'parse'
+SERIALIZE = 'serialize'
+STAGES = (CLIENT_ACQUIRE, QUEUE_WAIT, UPSTREAM, RETRY_SLEEP, PARSE, SERIALIZE)
+
+# Upstream calls range from milliseconds (cache, warm Space) to minutes (cold start)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+REQUESTS = Counter(
+    'classifier_requests_total', 'HTTP requests handled', ['backend', 'endpoint', 'status']
+)
+REQUEST_ERRORS = Counter(
+    'classifier_request_errors_total', 'HTTP requests answered with a 4xx or 5xx status', ['backend', 'endpoint', 'status']
+)
+REQUEST_LATENCY = Histogram(
+    'classifier_request_duration_seconds', 'End-to-end request latency', ['backend', 'endpoint'],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    'classifier_stage_duration_seconds', 'Latency of one stage of handling a request', ['backend', 'endpoint', 'stage'],
+    buckets=LATENCY_BUCKETS
+)
+
+_CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+class _Timings:
+    """Seconds spent per stage by one request, summed over its (possibly parallel) predictions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._durations = dict.fromkeys(STAGES, 0.0)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self._durations[name] = self._durations.get(name, 0.0) + seconds
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._durations)
+
+
+class _TimingsGroup:
+    """Attributes each stage to several requests at once"""
+
+    def __init__(self, members):
+        self.members = members
+
+    def add(self, name, seconds):
+        for timings in self.members:
+            timings.add(name, seconds)
+
+
+# Backend, route and stage timings of the request being handled; copied into worker threads with the rest of the context
+_backend = contextvars.ContextVar('metrics_backend', default='none')
+_endpoint = contextvars.ContextVar('metrics_endpoint', default='none')
+_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def record(name, seconds):
+    """Record a stage duration measured by the caller"""
+    STAGE_LATENCY.labels(_backend.get(), _endpoint.get(), name).observe(seconds)
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def stage(name):
+    """Time the block as one stage of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def current_timings():
+    """The current request's stage timings, to hand to work done on its behalf elsewhere"""
+    return _timings.get()
+
+
+@contextmanager
+def shared_timings(members):
+    """Attribute stages timed in the block to each of several requests, e.g. the items of one upstream batch"""
+    token = _timings.set(_TimingsGroup([timings for timings in members if timings is not None]))
+    try:
+        yield
+    finally:
+        _timings.reset(token)
+
+
+def server_timing(durations, total):
+    """Server-Timing header value, in milliseconds, with the stages in a fixed order"""
+    entries = [f"{name.replace('_', '-')};dur={seconds * 1000:.1f}" for name, seconds in durations.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(entries)
+
+
+class _StatsCollector:
+    """Exports the counters the resilience helpers of each instrumented backend already keep, read at scrape time"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sources = []
+
+    def add(self, backend, retry_stats, breakers, limiters):
+        with self._lock:
+            self._sources.append((backend, retry_stats, list(breakers), list(limiters)))
+
+    def collect(self):
+        with self._lock:
+            sources = list(self._sources)
+
+        errors = CounterMetricFamily(
+            'classifier_upstream_errors', 'Upstream errors by category and whether they were retried',
+            labels=['backend', 'category', 'outcome']
+        )
+        state = GaugeMetricFamily(
+            'classifier_circuit_state', 'Circuit breaker state: 0 closed, 1 half-open, 2 open',
+            labels=['backend', 'circuit']
+        )
+        opened = CounterMetricFamily(
+            'classifier_circuit_opened', 'Times the circuit breaker opened', labels=['backend', 'circuit']
+        )
+        limit = GaugeMetricFamily(
+            'classifier_upstream_concurrency_limit', 'Current adaptive limit on upstream calls in flight',
+            labels=['backend', 'limiter']
+        )
+        in_flight = GaugeMetricFamily(
+            'classifier_upstream_in_flight', 'Upstream calls in flight', labels=['backend', 'limiter']
+        )
+
+        for backend, retry_stats, breakers, limiters in sources:
+            if retry_stats is not None:
+                for category, counts in retry_stats.stats().items():
+                    errors.add_metric([backend, category, 'retried'], counts['retried'])
+                    errors.add_metric([backend, category, 'gave_up'], counts['gave_up'])
+            for breaker in breakers:
+                stats = breaker.stats()
+                state.add_metric([backend, breaker.name], _CIRCUIT_STATES[stats['state']])
+                opened.add_metric([backend, breaker.name], stats['times_opened'])
+            for limiter in limiters:
+                stats = limiter.stats()
+                limit.add_metric([backend, limiter.name], stats['limit'])
+                in_flight.add_metric([backend, limiter.name], stats['in_flight'])
+
+        yield errors
+        yield state
+        yield opened
+        yield limit
+        yield in_flight
+
+
+# One collector for the process, however many apps are instrumented in it
+_stats_collector = _StatsCollector()
+REGISTRY.register(_stats_collector)
+
+
+def instrument(app, backend, retry_stats=None, breakers=(), limiters=()):
+    """
+    Count and time every request of a Flask app, and serve the metrics at /metrics
+
+    Every response also gets a Server-Timing header with the request's stage
+    breakdown; with ?timing=true, JSON responses carry it as a `timing` field.
+    """
+    _stats_collector.add(backend, retry_stats, breakers, limiters)
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+        _backend.set(backend)
+        _endpoint.set(request.url_rule.rule if request.url_rule else 'unmatched')
+        _timings.set(_Timings())
+
+    @app.after_request
+    def _record_request(response):
+        endpoint = _endpoint.get()
+        status = str(response.status_code)
+        REQUESTS.labels(backend, endpoint, status).inc()
+        if response.status_code >= 400:
+            REQUEST_ERRORS.labels(backend, endpoint, status).inc()
+        if 'metrics_start' not in g:
+            return response
+        total = time.perf_counter() - g.metrics_start
+        REQUEST_LATENCY.labels(backend, endpoint).observe(total)
+
+        durations = _timings.get().snapshot()
+        response.headers['Server-Timing'] = server_timing(durations, total)
+        if request.args.get('timing', '').lower() in ('1', 'true') and response.is_json:
+            body = response.get_json()
+            if isinstance(body, dict):
+                body['timing'] = {f'{name}_ms': round(seconds * 1000, 1) for name, seconds in durations.items()}
+                body['timing']['total_ms'] = round(total * 1000, 1)
+                response.set_data(app.json.dumps(body))
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus metrics"""
+        return Response(generate_latest(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,94 @@
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Merge concurrent single-item requests into batched upstream calls
+
+    Items submitted from request threads are collected by a background thread
+    for up to max_batch_size items or max_wait_ms milliseconds, whichever
+    comes first, and handed to process_batch as one list. process_batch must
+    return one result per item, in the same order. Up to `workers` batches
+    can be in flight upstream at once. process_batch runs in the context
+    (contextvars) of the batch's first item.
+    """
+
+    def __init__(self, process_batch, max_batch_size=16, max_wait_ms=10, workers=1, name="micro-batcher"):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.workers = workers
+        self.name = name
+        self._queue = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._threads = []
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        """Queue an item and return a Future for its result"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, contextvars.copy_context()))
+        return future
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            if not self._threads:
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or the wait expires"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _, _ in batch]
+            with self._stats_lock:
+                self.batches += 1
+                self.items += len(items)
+            try:
+                results = batch[0][2].run(self.process_batch, items)
+                if len(results) != len(items):
+                    raise Exception(f"Batch returned {len(results)} results for {len(items)} inputs")
+            except Exception as e:
+                logger.error(f"Batch of {len(items)} failed: {str(e)}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_ms,
+            'queued': self._queue.qsize(),
+            'batches': self.batches,
+            'items': self.items,
+            'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0
+        }
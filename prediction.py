@@ -0,0 +1,60 @@
+def parse_space_result(result):
+    """
+    Extract (spam_confidence, ham_confidence) from a Space prediction
+
+    Returns None if the result is in a format we don't recognise. Raises if a
+    recognised format is malformed.
+    """
+    # Format 1: Dictionary with 'confidences' key
+    if isinstance(result, dict) and 'confidences' in result:
+        spam_confidence = next(
+            (item['confidence'] for item in result['confidences'] if 'Spam' in item['label']),
+            0
+        )
+        ham_confidence = next(
+            (item['confidence'] for item in result['confidences'] if 'Ham' in item['label']),
+            0
+        )
+    # Format 2: Dictionary with 'label' key (direct output)
+    elif isinstance(result, dict) and 'label' in result:
+        if result['label'] == 'Spam':
+            spam_confidence = result.get('confidence', 0.5)
+            ham_confidence = 1 - spam_confidence
+        else:
+            ham_confidence = result.get('confidence', 0.5)
+            spam_confidence = 1 - ham_confidence
+    # Format 3: Tuple or list format
+    elif isinstance(result, (tuple, list)):
+        # Assume first element is label, second is confidence dict
+        spam_confidence = result[1].get('Spam', 0) if len(result) > 1 else 0
+        ham_confidence = result[1].get('Ham', 0) if len(result) > 1 else 0
+    else:
+        return None
+
+    return spam_confidence, ham_confidence
+
+
+def is_cacheable(result):
+    """Whether a Space prediction is worth caching: it parses, and has the confidences /classify/batch reads"""
+    if not isinstance(result, dict) or not isinstance(result.get('confidences'), list):
+        return False
+    try:
+        return parse_space_result(result) is not None
+    except Exception:
+        return False
+
+
+def build_response(text, spam_confidence, ham_confidence):
+    """Build the /classify response body"""
+    label = "spam" if spam_confidence > ham_confidence else "ham"
+    confidence = max(spam_confidence, ham_confidence)
+
+    return {
+        'text': text,
+        'label': label,
+        'confidence': round(confidence, 4),
+        'probabilities': {
+            'spam': round(spam_confidence, 4),
+            'ham': round(ham_confidence, 4)
+        }
+    }
@@ -0,0 +1,108 @@
+import threading
+
+import requests
+
+try:
+    from gradio_client.exceptions import AppError, AuthenticationError
+    from gradio_client.utils import InvalidAPIEndpointError, QueueError, TooManyRequestsError
+except ImportError:  # backend_inference_api.py runs without gradio_client
+    AppError = AuthenticationError = InvalidAPIEndpointError = QueueError = TooManyRequestsError = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Error categories; only the ones in RETRYABLE_CATEGORIES go through the backoff schedule
+CONNECTION = 'connection'
+TIMEOUT = 'timeout'
+RATE_LIMITED = 'rate_limited'
+UPSTREAM_UNAVAILABLE = 'upstream_unavailable'
+SERVER_ERROR = 'server_error'
+SPACE_WAKING = 'space_waking'
+CLIENT_ERROR = 'client_error'
+APP_ERROR = 'app_error'
+MALFORMED_RESULT = 'malformed_result'
+UNKNOWN = 'unknown'
+
+RETRYABLE_CATEGORIES = {CONNECTION, TIMEOUT, RATE_LIMITED, UPSTREAM_UNAVAILABLE, SPACE_WAKING, UNKNOWN}
+
+
+def _types(*candidates):
+    return tuple(candidate for candidate in candidates if candidate is not None)
+
+
+_TIMEOUT_ERRORS = _types(TimeoutError, requests.exceptions.Timeout, httpx and httpx.TimeoutException)
+_CONNECTION_ERRORS = _types(ConnectionError, requests.exceptions.ConnectionError, httpx and httpx.TransportError)
+_RATE_LIMIT_ERRORS = _types(QueueError, TooManyRequestsError)
+_TERMINAL_APP_ERRORS = _types(AppError, AuthenticationError, InvalidAPIEndpointError)
+_MALFORMED_ERRORS = (KeyError, IndexError, TypeError, AttributeError, ValueError)
+
+
+def classify_status(status_code):
+    """Category for an HTTP status code returned by an upstream"""
+    if status_code == 429:
+        return RATE_LIMITED
+    if status_code in (502, 503, 504):
+        return UPSTREAM_UNAVAILABLE
+    if 400 <= status_code < 500:
+        return CLIENT_ERROR
+    if status_code >= 500:
+        return SERVER_ERROR
+    return UNKNOWN
+
+
+def classify_error(error, stage='predict'):
+    """
+    Category for an exception raised by an upstream call
+
+    stage is 'connect' while establishing a client, where an unparseable
+    response or "could not fetch config" means the Space is still waking up,
+    or 'predict' for a prediction, where the same errors are deterministic.
+    """
+    # Timeouts first: several timeout types also derive from connection errors
+    if isinstance(error, _TIMEOUT_ERRORS):
+        return TIMEOUT
+    if isinstance(error, _CONNECTION_ERRORS):
+        return CONNECTION
+    if isinstance(error, _RATE_LIMIT_ERRORS):
+        return RATE_LIMITED
+
+    response = getattr(error, 'response', None)
+    status_code = getattr(response, 'status_code', None)
+    if isinstance(status_code, int):
+        return classify_status(status_code)
+
+    if isinstance(error, _TERMINAL_APP_ERRORS):
+        return APP_ERROR
+    # json.JSONDecodeError is a ValueError too
+    if stage == 'connect' and isinstance(error, ValueError):
+        return SPACE_WAKING
+    if isinstance(error, _MALFORMED_ERRORS):
+        return MALFORMED_RESULT
+    return UNKNOWN
+
+
+def is_retryable(category):
+    return category in RETRYABLE_CATEGORIES
+
+
+class RetryStats:
+    """Per-category counters of upstream errors, and whether each one was retried"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, category, retried):
+        with self._lock:
+            counts = self._counts.setdefault(category, {'errors': 0, 'retried': 0, 'gave_up': 0})
+            counts['errors'] += 1
+            counts['retried' if retried else 'gave_up'] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                category: dict(counts, retryable=is_retryable(category))
+                for category, counts in sorted(self._counts.items())
+            }
@@ -0,0 +1,139 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+class _Slot:
+    __slots__ = ('index', 'buckets', 'calls', 'errors', 'retries', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.reset(None)
+
+    def reset(self, index):
+        self.index = index
+        self.buckets = {}
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class RollingStats:
+    """
+    Upstream latency, error, retry and cache counters over sliding time windows
+
+    Time is cut into `slot_seconds` slots kept in a fixed ring long enough
+    for the largest window. Latencies go into logarithmic (HDR-style) buckets
+    `precision` apart, so each slot holds at most a fixed number of counters
+    whatever the traffic, recording is a lock, a log and two increments, and
+    percentiles are accurate to within `precision` relative error. Exceptions
+    listed in `ignore_errors` are not counted as upstream calls at all.
+    """
+
+    def __init__(self, windows=(60, 300, 900), slot_seconds=10, min_latency=0.0001, max_latency=600.0,
+                 precision=0.02, ignore_errors=()):
+        self.windows = tuple(windows)
+        self.slot_seconds = slot_seconds
+        self.min_latency = min_latency
+        self.max_latency = max_latency
+        self.ignore_errors = tuple(ignore_errors)
+        self._log_base = math.log1p(precision)
+        self._slots = [_Slot() for _ in range(math.ceil(max(self.windows) / slot_seconds) + 1)]
+        self._lock = threading.Lock()
+
+    def _bucket(self, seconds):
+        seconds = min(max(seconds, self.min_latency), self.max_latency)
+        return int(math.log(seconds / self.min_latency) / self._log_base)
+
+    def _bucket_value(self, bucket):
+        """Midpoint of a bucket, in seconds"""
+        return self.min_latency * math.exp((bucket + 0.5) * self._log_base)
+
+    def _current_slot(self):
+        """Slot for now, recycled if it last held an older period; caller holds the lock"""
+        index = int(time.monotonic() // self.slot_seconds)
+        slot = self._slots[index % len(self._slots)]
+        if slot.index != index:
+            slot.reset(index)
+        return slot
+
+    def record_call(self, seconds, error=False, retry=False):
+        bucket = self._bucket(seconds)
+        with self._lock:
+            slot = self._current_slot()
+            slot.buckets[bucket] = slot.buckets.get(bucket, 0) + 1
+            slot.calls += 1
+            slot.errors += error
+            slot.retries += retry
+
+    @contextmanager
+    def upstream_call(self, retry=False):
+        """Time the block as one upstream call; it counts as an error if it raises"""
+        start = time.monotonic()
+        try:
+            yield
+        except self.ignore_errors:
+            raise
+        except Exception:
+            self.record_call(time.monotonic() - start, error=True, retry=retry)
+            raise
+        self.record_call(time.monotonic() - start, retry=retry)
+
+    def record_cache(self, hit):
+        with self._lock:
+            slot = self._current_slot()
+            if hit:
+                slot.cache_hits += 1
+            else:
+                slot.cache_misses += 1
+
+    def _window(self, seconds, now_index):
+        """Merge the slots of the last `seconds`; caller holds the lock"""
+        first = now_index - math.ceil(seconds / self.slot_seconds) + 1
+        merged = _Slot()
+        for slot in self._slots:
+            if slot.index is None or slot.index < first or slot.index > now_index:
+                continue
+            for bucket, count in slot.buckets.items():
+                merged.buckets[bucket] = merged.buckets.get(bucket, 0) + count
+            merged.calls += slot.calls
+            merged.errors += slot.errors
+            merged.retries += slot.retries
+            merged.cache_hits += slot.cache_hits
+            merged.cache_misses += slot.cache_misses
+        return merged
+
+    def _percentiles(self, buckets, total, quantiles=(0.5, 0.95, 0.99)):
+        result = {}
+        ordered = sorted(buckets.items())
+        for quantile in quantiles:
+            rank = quantile * total
+            seen = 0
+            for bucket, count in ordered:
+                seen += count
+                if seen >= rank:
+                    result[f'p{round(quantile * 100)}_ms'] = round(self._bucket_value(bucket) * 1000, 1)
+                    break
+        return result
+
+    def snapshot(self):
+        now_index = int(time.monotonic() // self.slot_seconds)
+        with self._lock:
+            merged = {seconds: self._window(seconds, now_index) for seconds in self.windows}
+
+        windows = {}
+        for seconds, window in merged.items():
+            lookups = window.cache_hits + window.cache_misses
+            stats = {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+            if window.calls:
+                stats.update(self._percentiles(window.buckets, window.calls))
+            stats.update({
+                'upstream_calls': window.calls,
+                'error_rate': round(window.errors / window.calls, 4) if window.calls else None,
+                'retry_rate': round(window.retries / window.calls, 4) if window.calls else None,
+                'cache_hit_ratio': round(window.cache_hits / lookups, 4) if lookups else None
+            })
+            windows[f'{seconds // 60}m' if seconds % 60 == 0 else f'{seconds}s'] = stats
+        return windows
@@ -0,0 +1,80 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution
+
+    The first caller for a key runs the function; every caller that arrives
+    while it is still running waits for, and shares, the same outcome.
+    Errors listed in `leader_errors` (e.g. the leader running out of its own
+    time budget) are not shared: a waiting caller that gets one instead runs
+    the call again itself, or joins whoever got there first.
+    If given, on_wait(seconds) is called with the time each waiting caller
+    spent on someone else's call, so it can be attributed to its request.
+    """
+
+    def __init__(self, leader_errors=(), on_wait=None):
+        self.leader_errors = tuple(leader_errors)
+        self.on_wait = on_wait
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.rejoined = 0
+
+    def do(self, key, fn, *args, timeout=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) once per in-flight key and return its result
+
+        Callers that join an in-flight call wait at most `timeout` seconds for
+        it and get concurrent.futures.TimeoutError if it takes longer.
+        """
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                future = self._in_flight.get(key)
+                if future is not None:
+                    self.coalesced += 1
+                    leader = False
+                else:
+                    future = Future()
+                    self._in_flight[key] = future
+                    self.executions += 1
+                    leader = True
+
+            if leader:
+                break
+            remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - start))
+            joined_at = time.perf_counter()
+            try:
+                return future.result(timeout=remaining)
+            except self.leader_errors:
+                if not future.done():
+                    # Our own wait ran out, not the leader's
+                    raise
+                with self._lock:
+                    self.rejoined += 1
+            finally:
+                if self.on_wait is not None:
+                    self.on_wait(time.perf_counter() - joined_at)
+
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+        return future.result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._in_flight),
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'rejoined': self.rejoined
+            }
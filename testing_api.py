@@ -2,9 +2,14 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 from gradio_client import Client
 import logging
+import os
+import threading
 import time
 import json
 
+from liveness import probe_space
+from retry_policy import RetryStats, classify_error, is_retryable
+
 app = Flask(__name__)
 
 CORS(app, resources={
@@ -24,6 +29,23 @@ SPACE_NAME = "Anurag3703/bert-spam-classifier-demo"
 _client = None
 _client_init_time = None
 
+# The client is replaced in the background once it is CLIENT_TTL_SECONDS - CLIENT_REFRESH_AHEAD_SECONDS
+# old; requests keep using the current one until the replacement passes its liveness probe
+CLIENT_TTL_SECONDS = float(os.environ.get('CLIENT_TTL_SECONDS', 600))
+CLIENT_REFRESH_AHEAD_SECONDS = float(os.environ.get('CLIENT_REFRESH_AHEAD_SECONDS', 60))
+CLIENT_REFRESH_RETRY_SECONDS = float(os.environ.get('CLIENT_REFRESH_RETRY_SECONDS', 30))
+_refresh_lock = threading.Lock()
+_refresh_state = {
+    'in_progress': False,
+    'refreshes': 0,
+    'failures': 0,
+    'last_attempt_at': None,
+    'last_error': None
+}
+
+# Upstream errors by category; only retryable categories are retried
+_retry_stats = RetryStats()
+
 
 def get_client(max_retries=5, initial_wait=20):
     """
@@ -31,14 +53,13 @@ def get_client(max_retries=5, initial_wait=20):
     """
     global _client, _client_init_time
 
-    # Return cached client if recent (within 10 minutes)
-    if _client is not None:
-        if _client_init_time and (time.time() - _client_init_time) < 600:
-            logger.info("Using cached client")
-            return _client
-        else:
-            logger.info("Client cache expired")
-            _client = None
+    # Return the cached client, refreshing it in the background as it gets old
+    client = _client
+    if client is not None:
+        if _client_init_time and time.time() - _client_init_time >= CLIENT_TTL_SECONDS - CLIENT_REFRESH_AHEAD_SECONDS:
+            _start_client_refresh()
+        logger.info("Using cached client")
+        return client
 
     # Initialize with retry and progressive backoff
     for attempt in range(max_retries):
@@ -58,12 +79,12 @@ def get_client(max_retries=5, initial_wait=20):
                 logger.warning(f"JSON decode error (Space still waking): {str(e)}")
                 raise Exception("Space is still initializing")
 
-            # Test with sample prediction
+            # Cheap liveness probe; /warmup still runs a full test prediction
             try:
-                test_result = _client.predict("test", api_name="/predict")
-                logger.info(f"Test prediction successful: {test_result}")
+                probe_space(_client)
+                logger.info("Liveness probe successful")
             except Exception as e:
-                logger.warning(f"Test prediction failed: {str(e)}")
+                logger.warning(f"Liveness probe failed: {str(e)}")
                 raise
 
             _client_init_time = time.time()
@@ -72,7 +93,13 @@ def get_client(max_retries=5, initial_wait=20):
 
         except Exception as e:
             error_msg = str(e)
-            logger.warning(f"Attempt {attempt + 1} failed: {error_msg}")
+            category = classify_error(e, stage='connect')
+            logger.warning(f"Attempt {attempt + 1} failed ({category}): {error_msg}")
+
+            if not is_retryable(category):
+                _retry_stats.record(category, retried=False)
+                raise Exception(f"Could not connect to Space ({category}): {error_msg}")
+            _retry_stats.record(category, retried=attempt < max_retries - 1)
 
             if attempt < max_retries - 1:
                 # Progressive backoff: 20s, 30s, 40s, 50s
@@ -88,6 +115,49 @@ def get_client(max_retries=5, initial_wait=20):
     return _client
 
 
+def _start_client_refresh():
+    """Start a background refresh unless one is running or the last one failed too recently"""
+    with _refresh_lock:
+        if _refresh_state['in_progress']:
+            return
+        last_attempt = _refresh_state['last_attempt_at']
+        if (_refresh_state['last_error'] and last_attempt
+                and time.time() - last_attempt < CLIENT_REFRESH_RETRY_SECONDS):
+            return
+        _refresh_state['in_progress'] = True
+        _refresh_state['last_attempt_at'] = time.time()
+
+    threading.Thread(target=_refresh_client, name='client-refresh', daemon=True).start()
+
+
+def _refresh_client():
+    """Connect and probe a replacement client, then swap it in; the old one serves until then"""
+    global _client, _client_init_time
+
+    try:
+        client = Client(SPACE_NAME, verbose=False)
+        try:
+            probe_space(client)
+        except Exception:
+            client.close()
+            raise
+        previous, _client, _client_init_time = _client, client, time.time()
+        if previous is not None:
+            previous.close()
+        with _refresh_lock:
+            _refresh_state['refreshes'] += 1
+            _refresh_state['last_error'] = None
+        logger.info("✅ Space client refreshed")
+    except Exception as e:
+        logger.warning(f"Background client refresh failed: {str(e)}")
+        with _refresh_lock:
+            _refresh_state['failures'] += 1
+            _refresh_state['last_error'] = str(e)
+    finally:
+        with _refresh_lock:
+            _refresh_state['in_progress'] = False
+
+
 @app.route('/classify', methods=['POST'])
 def classify():
     """Classify text as spam or ham"""
@@ -124,9 +194,14 @@ def classify():
                 logger.info(f"Prediction result: {result}")
                 break
             except Exception as e:
-                logger.warning(f"Prediction attempt {attempt + 1} failed: {str(e)}")
-                if attempt < max_retries - 1:
+                category = classify_error(e)
+                logger.warning(f"Prediction attempt {attempt + 1} failed ({category}): {str(e)}")
+                retry = is_retryable(category) and attempt < max_retries - 1
+                _retry_stats.record(category, retried=retry)
+                if retry:
                     time.sleep(5)
+                elif not is_retryable(category):
+                    raise Exception(f"Prediction failed ({category}): {str(e)}")
                 else:
                     # Client might be stale, reset it
                     global _client
@@ -219,7 +294,16 @@ def health():
         'status': 'healthy',
         'space': SPACE_NAME,
         'client_status': client_status,
-        'client_age_seconds': space_age
+        'client_age_seconds': space_age,
+        'client_refresh': {
+            'in_progress': _refresh_state['in_progress'],
+            'refreshes': _refresh_state['refreshes'],
+            'failures': _refresh_state['failures'],
+            'last_error': _refresh_state['last_error'],
+            'ttl_seconds': CLIENT_TTL_SECONDS,
+            'refresh_ahead_seconds': CLIENT_REFRESH_AHEAD_SECONDS
+        },
+        'upstream_errors': _retry_stats.stats()
     })
 
 
@@ -246,8 +330,6 @@ def home():
 
 
 if __name__ == '__main__':
-    import os
-
     port = int(os.environ.get('PORT', 5000))
     logger.info(f"🚀 Starting on port {port}")
     logger.info(f"📡 Space: {SPACE_NAME}")
@@ -0,0 +1,59 @@
+import unittest
+from concurrent.futures import Future
+
+from admission_queue import AdmissionQueue, QueueFullError
+
+
+def done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class AdmissionQueueTest(unittest.TestCase):
+    def test_hold_is_all_or_nothing(self):
+        admission = AdmissionQueue(max_size=3, retry_after=7)
+        admission.hold(['a', 'b'])
+
+        with self.assertRaises(QueueFullError) as raised:
+            admission.hold(['c', 'd'])
+        self.assertEqual(raised.exception.retry_after, 7)
+        self.assertEqual(admission.stats()['held'], 2)
+        self.assertEqual(admission.stats()['rejected'], 2)
+
+    def test_flush_starts_items_in_order_and_resolves_futures(self):
+        admission = AdmissionQueue(max_size=10)
+        futures = admission.hold(['a', 'b', 'c'])
+        started = []
+
+        admission.flush(lambda item: started.append(item) or done(item.upper()))
+
+        self.assertEqual(started, ['a', 'b', 'c'])
+        self.assertEqual([future.result(timeout=1) for future in futures], ['A', 'B', 'C'])
+        self.assertEqual(admission.stats()['held'], 0)
+
+    def test_cancelled_items_are_skipped(self):
+        admission = AdmissionQueue(max_size=10)
+        futures = admission.hold(['a', 'b'])
+        futures[0].cancel()
+        started = []
+
+        admission.flush(lambda item: started.append(item) or done(item))
+
+        self.assertEqual(started, ['b'])
+        self.assertEqual(admission.stats()['abandoned'], 1)
+
+    def test_fail_resolves_every_item_with_the_error(self):
+        admission = AdmissionQueue(max_size=10)
+        futures = admission.hold(['a', 'b'])
+        error = ConnectionError('Space did not wake up')
+
+        admission.fail(error)
+
+        for future in futures:
+            self.assertIs(future.exception(timeout=1), error)
+        self.assertEqual(admission.stats()['failed'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
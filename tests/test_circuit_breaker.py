@@ -0,0 +1,68 @@
+import time
+import unittest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def open_breaker(self, recovery_timeout=0.1):
+        breaker = CircuitBreaker('test', failure_threshold=3, recovery_timeout=recovery_timeout)
+        for _ in range(3):
+            breaker.record_failure()
+        return breaker
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker('test', failure_threshold=3, recovery_timeout=30)
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError) as raised:
+            breaker.before_call()
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+
+    def test_half_open_allows_a_single_probe(self):
+        breaker = self.open_breaker()
+        time.sleep(0.15)
+        self.assertEqual(breaker.state, HALF_OPEN)
+
+        breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.before_call()
+
+    def test_failed_probe_reopens(self):
+        breaker = self.open_breaker()
+        time.sleep(0.15)
+        breaker.before_call()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.stats()['times_opened'], 2)
+
+    def test_released_probe_can_be_retried(self):
+        breaker = self.open_breaker()
+        time.sleep(0.15)
+        breaker.before_call()
+        breaker.release()
+        breaker.before_call()
+
+    def test_check_does_not_use_up_the_probe(self):
+        breaker = self.open_breaker()
+        with self.assertRaises(CircuitOpenError):
+            breaker.check()
+        time.sleep(0.15)
+        breaker.check()
+        breaker.before_call()
+
+
+if __name__ == '__main__':
+    unittest.main()
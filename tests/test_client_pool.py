@@ -0,0 +1,102 @@
+import threading
+import time
+import unittest
+
+from client_pool import ClientPool
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.005)
+
+
+class StandInClient:
+    """Mimics the parts of gradio_client.Client the pool touches: slow to create, has close()"""
+
+    init_delay = 0.0
+    fail = False
+
+    def __init__(self):
+        if self.fail:
+            raise ConnectionError('Space unavailable')
+        time.sleep(self.init_delay)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ClientPoolTest(unittest.TestCase):
+    def setUp(self):
+        StandInClient.init_delay = 0.0
+        StandInClient.fail = False
+
+    def filled_pool(self, size=2, **kwargs):
+        pool = ClientPool(StandInClient, size=size, **kwargs)
+        pool.renew()
+        wait_until(lambda: pool.stats()['healthy'] == size)
+        return pool
+
+    def test_renew_keeps_the_pool_full(self):
+        pool = self.filled_pool()
+        old = [entry.client for entry in pool._members.values()]
+        StandInClient.init_delay = 0.2
+
+        pool.renew()
+        # The old clients keep serving while their replacements are created
+        self.assertEqual(pool.stats()['idle'], 2)
+        with pool.checkout(timeout=0.05) as client:
+            self.assertIn(client, old)
+
+        wait_until(lambda: pool.stats()['clients_created'] == 4)
+        self.assertEqual(pool.stats()['healthy'], 2)
+        wait_until(lambda: all(client.closed for client in old))
+
+    def test_client_checked_out_during_renew_is_closed_on_return(self):
+        pool = self.filled_pool(size=1)
+        with pool.checkout(timeout=1) as client:
+            pool.renew()
+            wait_until(lambda: pool.stats()['clients_created'] == 2)
+            self.assertFalse(client.closed)
+        wait_until(lambda: client.closed)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+    def test_failing_client_is_replaced_and_closed(self):
+        pool = self.filled_pool(size=1, max_failures=2)
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                with pool.checkout(timeout=1) as client:
+                    raise ValueError('prediction failed')
+
+        wait_until(lambda: pool.stats()['replacements'] == 1 and pool.stats()['healthy'] == 1)
+        wait_until(lambda: client.closed)
+        with pool.checkout(timeout=1) as replacement:
+            self.assertIsNot(replacement, client)
+
+    def test_ignored_errors_are_not_held_against_the_client(self):
+        pool = self.filled_pool(size=1, max_failures=1, ignore_errors=(TimeoutError,))
+        with self.assertRaises(TimeoutError):
+            with pool.checkout(timeout=1):
+                raise TimeoutError
+        self.assertEqual(pool.stats()['replacements'], 0)
+
+    def test_renew_supersedes_replacements_still_retrying(self):
+        StandInClient.fail = True
+        pool = ClientPool(StandInClient, size=2, replace_delay=0.05)
+        for _ in range(3):
+            pool.renew()
+            time.sleep(0.1)
+
+        replacing = [thread for thread in threading.enumerate() if thread.name.startswith('client-pool-replace')]
+        self.assertLessEqual(len(replacing), 2)
+
+        StandInClient.fail = False
+        wait_until(lambda: pool.stats()['healthy'] == 2)
+        wait_until(lambda: not any(thread.is_alive() for thread in replacing))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import threading
+import time
+import unittest
+
+from concurrency_limiter import AdaptiveLimiter, LimitExceeded
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.005)
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+    def test_waits_are_bounded_by_the_limit(self):
+        limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_limit=1)
+        with limiter.slot():
+            with self.assertRaises(LimitExceeded):
+                with limiter.slot(timeout=0.05):
+                    pass
+        self.assertEqual(limiter.stats()['rejections'], 1)
+        with limiter.slot(timeout=0.05):
+            self.assertEqual(limiter.stats()['in_flight'], 1)
+
+    def test_overload_lowers_the_limit(self):
+        limiter = AdaptiveLimiter(initial_limit=10, max_limit=10, backoff_ratio=0.5)
+        with limiter.slot() as slot:
+            slot.drop()
+        self.assertEqual(limiter.limit, 5)
+
+    def test_ignored_errors_leave_the_limit_alone(self):
+        limiter = AdaptiveLimiter(initial_limit=10, max_limit=10, is_overload=lambda error: False)
+        with self.assertRaises(ValueError):
+            with limiter.slot():
+                raise ValueError('bad input')
+        self.assertEqual(limiter.limit, 10)
+        self.assertEqual(limiter.stats()['in_flight'], 0)
+
+    def run_waiters(self, limiter, lanes):
+        """Queue one waiter per lane in order behind a held slot, release it and return the grant order"""
+        granted = []
+        threads = []
+
+        def waiter(lane):
+            with limiter.slot(lane=lane):
+                granted.append(lane)
+
+        with limiter.slot():
+            for count, lane in enumerate(lanes, start=1):
+                thread = threading.Thread(target=waiter, args=(lane,))
+                thread.start()
+                threads.append(thread)
+                wait_until(lambda: limiter.stats()['waiting'] == count)
+        for thread in threads:
+            thread.join()
+        return granted
+
+    def test_higher_lane_goes_first(self):
+        limiter = AdaptiveLimiter(
+            initial_limit=1, min_limit=1, max_limit=1, lanes=('interactive', 'batch'), min_share=0
+        )
+        granted = self.run_waiters(limiter, ['batch', 'batch', 'interactive', 'interactive'])
+        self.assertEqual(granted, ['interactive', 'interactive', 'batch', 'batch'])
+
+    def test_lower_lane_keeps_its_minimum_share(self):
+        limiter = AdaptiveLimiter(
+            initial_limit=1, min_limit=1, max_limit=1, lanes=('interactive', 'batch'), min_share=0.5
+        )
+        granted = self.run_waiters(limiter, ['batch', 'batch'] + ['interactive'] * 4)
+        # With a 50% share, batch is never passed over twice in a row while it waits
+        self.assertEqual(granted[:4], ['interactive', 'batch', 'interactive', 'batch'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import threading
+import time
+import unittest
+
+from deadline import DeadlineExceeded
+from single_flight import SingleFlight
+
+
+def start(fn, *args):
+    """Run fn(*args) on a thread and return (thread, outcome dict)"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = fn(*args)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'done'
+
+        runs = [start(flight.do, 'key', slow) for _ in range(5)]
+        for thread, _ in runs:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([outcome['result'] for _, outcome in runs], ['done'] * 5)
+        self.assertEqual(flight.stats()['coalesced'], 4)
+
+    def test_errors_are_shared(self):
+        flight = SingleFlight(leader_errors=(DeadlineExceeded,))
+
+        def failing():
+            time.sleep(0.2)
+            raise ValueError('bad input')
+
+        leader, leader_outcome = start(flight.do, 'key', failing)
+        time.sleep(0.05)
+        follower, follower_outcome = start(flight.do, 'key', lambda: 'unused')
+        leader.join()
+        follower.join()
+
+        self.assertIsInstance(leader_outcome['error'], ValueError)
+        self.assertIsInstance(follower_outcome['error'], ValueError)
+
+    def test_follower_retries_after_leader_timeout(self):
+        flight = SingleFlight(leader_errors=(DeadlineExceeded,))
+
+        def leader_call():
+            time.sleep(0.2)
+            raise DeadlineExceeded('leader ran out of time')
+
+        leader, leader_outcome = start(flight.do, 'key', leader_call)
+        time.sleep(0.05)
+        follower, follower_outcome = start(flight.do, 'key', lambda: 'follower result')
+        leader.join()
+        follower.join()
+
+        self.assertIsInstance(leader_outcome['error'], DeadlineExceeded)
+        self.assertEqual(follower_outcome['result'], 'follower result')
+        self.assertEqual(flight.stats()['rejoined'], 1)
+
+    def test_on_wait_reports_follower_wait(self):
+        waits = []
+        flight = SingleFlight(on_wait=waits.append)
+
+        def slow():
+            time.sleep(0.2)
+            return 'done'
+
+        leader, _ = start(flight.do, 'key', slow)
+        time.sleep(0.05)
+        flight.do('key', slow)
+        leader.join()
+
+        self.assertEqual(len(waits), 1)
+        self.assertGreater(waits[0], 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()